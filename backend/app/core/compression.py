@@ -0,0 +1,131 @@
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+def choose_encoding(accept_encoding):
+    """Pick 'br' or 'gzip' from an Accept-Encoding header (q=0 means refused)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=brotli_quality)
+            self._process = getattr(self._impl, "process", None) or self._impl.compress
+        else:
+            self._impl = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+            self._process = self._impl.compress
+        self._encoding = encoding
+
+    def compress(self, data):
+        return self._process(data)
+
+    def finish(self):
+        if self._encoding == "br":
+            return self._impl.finish()
+        return self._impl.flush()
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli response compression negotiated via Accept-Encoding.
+
+    Responses smaller than minimum_size, already encoded, 204/304 responses and
+    event streams pass through untouched. Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = Headers(raw=start_message["headers"])
+                skip = (
+                    "content-encoding" in headers
+                    or start_message["status"] in (204, 304)
+                    or headers.get("content-type", "").startswith("text/event-stream")
+                    or (not more_body and len(body) < self.minimum_size)
+                )
+                if skip:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                out = compressor.compress(body)
+                if not more_body:
+                    out += compressor.finish()
+
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(out))
+                    etag = headers.get("etag")
+                    if etag and etag.endswith('"'):
+                        # The compressed body is a different representation (see etag_matches)
+                        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+                await send(start_message)
+                await send({"type": "http.response.body", "body": out, "more_body": more_body})
+                return
+
+            out = compressor.compress(body)
+            if not more_body:
+                out += compressor.finish()
+            await send({"type": "http.response.body", "body": out, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,69 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OperationCancelled(Exception):
+    """Raised inside a blocking call once its cancel event is set"""
+
+
+_io_executor = None
+_io_lock = threading.Lock()
+
+
+def get_io_executor():
+    """
+    Dedicated pool for file and archive work (extraction, directory walks, JSON reads,
+    moves). Sized by IO_THREADS so ingest can't take over the default executor.
+    """
+    global _io_executor
+    with _io_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("IO_THREADS", "4")),
+                thread_name_prefix="io",
+            )
+        return _io_executor
+
+
+def shutdown_io_executor():
+    global _io_executor
+    with _io_lock:
+        executor, _io_executor = _io_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the IO pool and await its result (in a copy of the caller's context)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_cancellable(func, *args, **kwargs):
+    """
+    Like run_blocking, for calls that accept a `cancel` threading.Event and check it
+    between units of work. If the awaiting task is cancelled the event is set, so the
+    worker thread stops at its next check instead of running to completion.
+    """
+    cancel = threading.Event()
+    try:
+        return await run_blocking(func, *args, cancel=cancel, **kwargs)
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+
+
+def io_executor_stats():
+    executor = _io_executor
+    if executor is None:
+        return {"max_workers": int(os.getenv("IO_THREADS", "4")), "threads": 0, "queued": 0}
+    return {
+        "max_workers": executor._max_workers,
+        "threads": len(executor._threads),
+        "queued": executor._work_queue.qsize(),
+    }
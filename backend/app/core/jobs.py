@@ -0,0 +1,110 @@
+import asyncio
+import traceback
+import uuid
+from datetime import datetime
+
+# Resumable background jobs over a collection, recorded in the jobs collection:
+#
+#   {"_id": hex, "type": str, "status": "queued" | "running" | "completed" | "failed",
+#    "last_id": ObjectId | None, "processed": int, <counters>: int,
+#    "started_at", "updated_at", "finished_at", "error", <job parameters>}
+#
+# Documents are processed in _id order, chunk by chunk. The last processed _id and the
+# counters are checkpointed after every chunk, so an interrupted job resumes where it
+# stopped.
+
+# Keep references to running jobs so they aren't garbage collected
+_running_jobs = {}
+
+
+class ChunkedJob:
+    """
+    One kind of resumable job.
+
+    :param job_type: "type" of its job records
+    :param name: label for log lines, e.g. "🔁 Revalidation"
+    :param counters: counter fields kept on the job record besides processed
+    :param fetch_chunk: async fetch_chunk(job, last_id, chunk_size) -> next documents by _id
+    :param process_chunk: async process_chunk(job, docs) -> {counter: increment}
+    """
+
+    def __init__(self, job_type, name, counters, fetch_chunk, process_chunk, chunk_size=20):
+        self.job_type = job_type
+        self.name = name
+        self.counters = tuple(counters)
+        self.fetch_chunk = fetch_chunk
+        self.process_chunk = process_chunk
+        self.chunk_size = chunk_size
+
+    async def run(self, job_collection, job_id):
+        job = await job_collection.find_one({"_id": job_id})
+        last_id = job.get("last_id")
+        processed = job.get("processed", 0)
+        counts = {counter: job.get(counter, 0) for counter in self.counters}
+
+        try:
+            await job_collection.update_one({"_id": job_id}, {"$set": {"status": "running"}})
+            while True:
+                docs = await self.fetch_chunk(job, last_id, self.chunk_size)
+                if not docs:
+                    break
+
+                for counter, increment in (await self.process_chunk(job, docs) or {}).items():
+                    counts[counter] += increment
+                last_id = docs[-1]["_id"]
+                processed += len(docs)
+                await job_collection.update_one(
+                    {"_id": job_id},
+                    {"$set": {"last_id": last_id, "processed": processed, **counts, "updated_at": datetime.utcnow()}},
+                )
+                print(f"{self.name} {job_id}: {processed} documents, "
+                      + ", ".join(f"{counter} {count}" for counter, count in counts.items()))
+                await asyncio.sleep(0)
+
+            await job_collection.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "completed", "finished_at": datetime.utcnow()}},
+            )
+        except Exception as e:
+            print(f"❌ {self.name} {job_id} failed: {e}")
+            traceback.print_exc()
+            await job_collection.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.utcnow()}},
+            )
+        finally:
+            _running_jobs.pop(job_id, None)
+
+    def _launch(self, job_collection, job_id):
+        _running_jobs[job_id] = asyncio.create_task(self.run(job_collection, job_id))
+
+    async def start(self, job_collection, **params):
+        """Create a job record (params are stored on it) and run the job in the background"""
+        job_id = uuid.uuid4().hex
+        await job_collection.insert_one({
+            "_id": job_id,
+            "type": self.job_type,
+            "status": "queued",
+            **params,
+            "last_id": None,
+            "processed": 0,
+            **{counter: 0 for counter in self.counters},
+            "started_at": datetime.utcnow(),
+        })
+        self._launch(job_collection, job_id)
+        return job_id
+
+    async def resume(self, job_collection, job_id):
+        """Continue an interrupted job from its checkpoint. Returns False if it can't be resumed."""
+        if job_id in _running_jobs:
+            return True
+        job = await job_collection.find_one({"_id": job_id, "type": self.job_type})
+        if not job or job.get("status") == "completed":
+            return False
+        self._launch(job_collection, job_id)
+        return True
+
+
+async def get_job(job_collection, job_type, job_id):
+    """Job record of the given type, or None"""
+    return await job_collection.find_one({"_id": job_id, "type": job_type})
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from collections import deque
+
+
+class EventLoopLagMonitor:
+    """
+    Measures event-loop lag: a task sleeps `interval` seconds and records how much
+    later than scheduled it actually woke up. Anything blocking the loop (sync file
+    I/O, CPU-heavy parsing) shows up directly as lag.
+    """
+
+    def __init__(self, interval=0.25, window=240):
+        self.interval = interval
+        self._samples = deque(maxlen=window)
+        self._max = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._samples.append(lag)
+            self._max = max(self._max, lag)
+
+    def stats(self):
+        """Lag in milliseconds over the recent window, plus the maximum since start"""
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0, "interval_ms": self.interval * 1000}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+        return {
+            "samples": len(samples),
+            "interval_ms": self.interval * 1000,
+            "window_seconds": round(len(samples) * self.interval, 1),
+            "last_ms": round(self._samples[-1] * 1000, 2),
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "window_max_ms": round(samples[-1] * 1000, 2),
+            "max_ms": round(self._max * 1000, 2),
+            "measured_at": time.time(),
+        }
+
+
+loop_monitor = EventLoopLagMonitor()
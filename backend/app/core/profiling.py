@@ -0,0 +1,190 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.executors import run_blocking
+from app.validation.utils import get_logs_dir
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+def get_profiles_dir():
+    profiles_dir = os.path.join(get_logs_dir(), "profiles")
+    os.makedirs(profiles_dir, exist_ok=True)
+    return profiles_dir
+
+
+def top_functions(profiler, limit=15):
+    """Top functions by cumulative time as JSON-friendly dicts"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "ncalls": nc,
+            "tottime": round(tt, 6),
+            "cumtime": round(ct, 6),
+        })
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:limit]
+
+
+class ProfileIndex:
+    """Recent profiles: in memory for fast listing, appended to logs/profiles/index.jsonl"""
+
+    def __init__(self, maxlen=50):
+        self._recent = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        index_path = os.path.join(get_profiles_dir(), "index.jsonl")
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._recent.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+
+    def add(self, entry):
+        with self._lock:
+            self._load()
+            self._recent.append(entry)
+            with open(os.path.join(get_profiles_dir(), "index.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def recent(self):
+        with self._lock:
+            self._load()
+            return list(reversed(self._recent))
+
+    def get(self, profile_id):
+        return next((e for e in self.recent() if e["id"] == profile_id), None)
+
+
+profile_index = ProfileIndex()
+
+
+def _save_profile(profiler, entry):
+    """Write the .prof file and add entry (plus file and top functions) to profile_index. Blocking."""
+    path = os.path.join(get_profiles_dir(), f"{entry['id']}.prof")
+    profiler.dump_stats(path)
+    profile_index.add({**entry, "file": os.path.basename(path), "top_functions": top_functions(profiler)})
+
+
+class _TaskProfiled:
+    """
+    Awaitable driving coro step by step with profiler enabled only during each step.
+    Between steps the task is suspended and the event loop runs other tasks, which
+    the profiler then doesn't see.
+    """
+
+    def __init__(self, coro, profiler):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        steps = self.coro.__await__()
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                if error is not None:
+                    yielded = steps.throw(error)
+                else:
+                    yielded = steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                steps.close()
+                raise
+            except BaseException as e:
+                # Cancellation and other exceptions thrown in by the task go to coro
+                value, error = None, e
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in cProfile of single requests.
+
+    A request is profiled when it sends "X-Profile: <PROFILE_ADMIN_TOKEN>" or its path is
+    listed in PROFILE_ROUTES (comma-separated). The .prof file goes to logs/profiles/,
+    the response carries X-Profile-Id, and profile_index keeps the top functions.
+
+    The profiler is only enabled while the request's own task runs a step (see
+    _TaskProfiled), so other in-flight requests and background tasks sharing the event
+    loop are not attributed to it. Work the request hands to other tasks, thread pools
+    or process pools is not included. One profiler can be active at a time, so
+    concurrent requests are not profiled while another profile runs.
+    """
+
+    def __init__(self, app, admin_token=None, routes=None):
+        self.app = app
+        self.admin_token = admin_token if admin_token is not None else os.getenv("PROFILE_ADMIN_TOKEN", "")
+        routes = routes if routes is not None else os.getenv("PROFILE_ROUTES", "")
+        self.routes = {r.strip() for r in routes.split(",") if r.strip()} if isinstance(routes, str) else set(routes)
+        self._busy = threading.Lock()
+
+    def is_admin(self, headers):
+        return bool(self.admin_token) and headers.get(PROFILE_HEADER) == self.admin_token
+
+    def _wants_profile(self, scope):
+        if scope["path"].startswith("/profiles"):
+            return False
+        if scope["path"] in self.routes:
+            return True
+        return self.is_admin(Headers(scope=scope))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        status = {"code": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(raw=message["headers"])[PROFILE_ID_HEADER] = profile_id
+            await send(message)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            await _TaskProfiled(self.app(scope, receive, send_wrapper), profiler)
+        finally:
+            self._busy.release()
+            elapsed = time.perf_counter() - started
+            try:
+                # Stats aggregation and file writes stay off the event loop
+                await run_blocking(_save_profile, profiler, {
+                    "id": profile_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "duration_s": round(elapsed, 4),
+                    "created_at": datetime.utcnow().isoformat(),
+                })
+                print(f"🧪 Profile {profile_id} written for {scope['method']} {scope['path']} ({elapsed:.2f}s)")
+            except Exception as e:
+                print(f"⚠️ Could not save profile {profile_id}: {e}")
@@ -0,0 +1,27 @@
+from decimal import Decimal
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _orjson_default(obj):
+    """Types orjson doesn't serialize natively (datetime, UUID, dataclasses are native)"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, "to_decimal"):  # bson.Decimal128
+        return float(obj.to_decimal())
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Mongo documents can be returned as-is:
+    ObjectId becomes its hex string and datetime an ISO string.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
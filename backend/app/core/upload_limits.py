@@ -0,0 +1,124 @@
+import asyncio
+import os
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+PEAK_RSS_HEADER = "X-Peak-RSS-MB"
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it can't be read"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class RequestTooLarge(HTTPException):
+    def __init__(self, limit):
+        super().__init__(status_code=413, detail=f"Request body exceeds {limit} bytes")
+
+
+class _RssSampler:
+    """Samples process RSS while a request runs; peak is the highest value seen"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.start = current_rss()
+        self.peak = self.start
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            rss = current_rss()
+            if rss > self.peak:
+                self.peak = rss
+
+    def begin(self):
+        if self.start is not None:
+            self._task = asyncio.create_task(self._run())
+
+    def end(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            rss = current_rss()
+            if rss > self.peak:
+                self.peak = rss
+
+
+class UploadLimitMiddleware:
+    """
+    Caps request bodies at max_request_bytes: a declared Content-Length above the
+    limit is refused with 413 before the body is read, and chunked bodies are
+    counted as they arrive (FastAPI turns the raised RequestTooLarge into a 413).
+
+    For memory_paths, process RSS is sampled while the request runs and the peak is
+    returned in the X-Peak-RSS-MB header. The value is process-wide, so concurrent
+    requests on the same worker show up in each other's peaks.
+    """
+
+    def __init__(self, app, max_request_bytes, memory_paths=(), sample_interval=0.05):
+        self.app = app
+        self.max_request_bytes = max_request_bytes
+        self.memory_paths = tuple(memory_paths)
+        self.sample_interval = sample_interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_request_bytes:
+            response = JSONResponse(
+                {"detail": f"Request body exceeds {self.max_request_bytes} bytes"}, status_code=413
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_wrapper():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_request_bytes:
+                    raise RequestTooLarge(self.max_request_bytes)
+            return message
+
+        if not self.memory_paths or not scope["path"].startswith(self.memory_paths):
+            await self.app(scope, receive_wrapper, send)
+            return
+
+        sampler = _RssSampler(self.sample_interval)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                sampler.end()
+                if sampler.peak is not None:
+                    peak_mb = sampler.peak / (1024 * 1024)
+                    delta_mb = (sampler.peak - sampler.start) / (1024 * 1024)
+                    MutableHeaders(scope=message)[PEAK_RSS_HEADER] = f"{peak_mb:.1f}"
+                    print(f"📈 {scope['path']}: peak RSS {peak_mb:.1f} MB (+{delta_mb:.1f} MB, {received} bytes received)")
+            await send(message)
+
+        sampler.begin()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            sampler.end()
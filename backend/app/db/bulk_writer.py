@@ -0,0 +1,63 @@
+import inspect
+import bson
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+class BulkUpsertBuffer:
+    """
+    Buffers UpdateOne(upsert=True) operations and sends them as one unordered bulk_write
+    once max_ops operations or max_bytes of update documents are pending.
+
+    Every operation carries a caller context; after each flush on_success(context) or
+    on_error(context, message) is called per operation, so failures map back to the
+    item that produced them. Callbacks may be coroutine functions; they are awaited.
+    """
+
+    def __init__(self, collection, on_success, on_error, max_ops=50, max_bytes=32 * 1024 * 1024):
+        self.collection = collection
+        self.on_success = on_success
+        self.on_error = on_error
+        self.max_ops = max_ops
+        self.max_bytes = max_bytes
+        self._ops = []
+        self._contexts = []
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._ops)
+
+    async def add(self, filter, update, context):
+        # Encode first: an unencodable update raises here without leaving a half-queued op
+        size = len(bson.encode(update))
+        self._ops.append(UpdateOne(filter, update, upsert=True))
+        self._contexts.append(context)
+        self._bytes += size
+        if len(self._ops) >= self.max_ops or self._bytes >= self.max_bytes:
+            await self.flush()
+
+    async def flush(self):
+        if not self._ops:
+            return
+        ops, contexts = self._ops, self._contexts
+        self._ops, self._contexts, self._bytes = [], [], 0
+
+        errors = {}
+        try:
+            result = await self.collection.bulk_write(ops, ordered=False)
+            print(f"💾 Bulk write: {len(ops)} ops ({result.upserted_count} inserted, {result.matched_count} updated)")
+        except BulkWriteError as bwe:
+            for write_error in bwe.details.get("writeErrors", []):
+                errors[write_error["index"]] = write_error.get("errmsg", "Write error")
+            print(f"⚠️ Bulk write: {len(errors)} of {len(ops)} ops failed")
+        except Exception as e:
+            print(f"❌ Bulk write failed: {e}")
+            errors = {idx: str(e) for idx in range(len(ops))}
+
+        for idx, context in enumerate(contexts):
+            if idx in errors:
+                outcome = self.on_error(context, errors[idx])
+            else:
+                outcome = self.on_success(context)
+            if inspect.isawaitable(outcome):
+                await outcome
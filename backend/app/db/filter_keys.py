@@ -0,0 +1,14 @@
+async def merge_filter_keys(filter_key_collection, keys):
+    """Merge keys into the filteredKey document in a single upsert round-trip"""
+    try:
+        keys = sorted(set(keys))
+        if not keys:
+            return
+        await filter_key_collection.update_one(
+            {"_id": "filter_keys"},
+            {"$addToSet": {"keys": {"$each": keys}}, "$inc": {"revision": 1}},
+            upsert=True,
+        )
+        print(f"✅ Merged filter keys: {keys}")
+    except Exception as e:
+        print(f"Error updating filter keys: {e}")
@@ -0,0 +1,163 @@
+import os
+from itertools import combinations
+from pymongo import ASCENDING, UpdateOne
+from app.validation.compare_strings import normalize_name, safe_string_compare
+
+# Blocking index over borrower names (borrowerNames collection), one entry per
+# normalized name:
+#
+#   {"_id": "john a smith", "name": "John A. Smith", "doc_ids": [ObjectId, ...],
+#    "keys": ["t:a john smith", "p:J500|S530"]}
+#
+# keys are blocking keys: the sorted-token form of the name ("t:") and the Soundex codes
+# of every pair of its tokens ("p:"), so misspellings (Smyth), reordering (Smith, John)
+# and an added or dropped middle name still share a key. A lookup fetches the entries
+# sharing any key through the multikey index and verifies only those with
+# safe_string_compare(..., "name").
+
+# Titles and suffixes that don't identify a person
+NAME_STOPWORDS = {"mr", "mrs", "ms", "miss", "dr", "jr", "sr", "ii", "iii", "iv", "and", "et", "al", "ux", "vir"}
+# Pair keys are built from at most this many distinct token codes (n*(n-1)/2 keys)
+MAX_KEY_TOKENS = 5
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def is_borrower_label(label):
+    return "borrower" in str(label).lower()
+
+
+def soundex(token):
+    """American Soundex code of a lowercase alphabetic token ("smith" -> "S530")"""
+    token = "".join(c for c in token if "a" <= c <= "z")
+    if not token:
+        return ""
+    code = [token[0].upper()]
+    previous = _SOUNDEX_CODES.get(token[0], "")
+    for c in token[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != previous:
+            code.append(digit)
+            if len(code) == 4:
+                break
+        if c not in "hw":
+            # h and w don't separate equal codes, vowels do
+            previous = digit
+    return "".join(code).ljust(4, "0")
+
+
+def name_tokens(name):
+    return [t for t in normalize_name(name).split() if t not in NAME_STOPWORDS]
+
+
+def blocking_keys(name):
+    """Sorted-token and Soundex-pair keys of a name; empty when nothing is left to block on"""
+    tokens = name_tokens(name)
+    if not tokens:
+        return []
+    keys = {"t:" + " ".join(sorted(tokens))}
+    # Initials are too common to block on unless they are all there is
+    significant = [t for t in tokens if len(t) > 1] or tokens
+    codes = sorted({soundex(t) for t in significant})[:MAX_KEY_TOKENS]
+    if len(codes) == 1:
+        keys.add("p:" + codes[0])
+    for first, second in combinations(codes, 2):
+        keys.add(f"p:{first}|{second}")
+    return sorted(keys)
+
+
+def borrower_names(entries):
+    """{normalized name: display name} of the borrower values among label_value_entries() entries"""
+    names = {}
+    for entry in entries:
+        if is_borrower_label(entry["label"]):
+            normalized = " ".join(name_tokens(entry["value"]))
+            if normalized:
+                names.setdefault(normalized, entry["value"])
+    return names
+
+
+async def ensure_name_indexes(collection):
+    await collection.create_index([("keys", ASCENDING)])
+    await collection.create_index([("doc_ids", ASCENDING)])
+
+
+async def remove_document_names(collection, doc_ids=None):
+    """Detach documents from their names (all names when doc_ids is None); orphaned names are dropped"""
+    if doc_ids is None:
+        await collection.delete_many({})
+        return
+    doc_ids = list(doc_ids)
+    if not doc_ids:
+        return
+    await collection.update_many({"doc_ids": {"$in": doc_ids}}, {"$pull": {"doc_ids": {"$in": doc_ids}}})
+    await collection.delete_many({"doc_ids": {"$size": 0}})
+
+
+async def replace_document_names(collection, doc_id, names):
+    """Make names ({normalized: display}) the complete set of borrower names of one document"""
+    await remove_document_names(collection, [doc_id])
+    ops = [
+        UpdateOne(
+            {"_id": normalized},
+            {
+                "$setOnInsert": {"name": display},
+                "$set": {"keys": blocking_keys(normalized)},
+                "$addToSet": {"doc_ids": doc_id},
+            },
+            upsert=True,
+        )
+        for normalized, display in names.items()
+    ]
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+
+
+def verify_candidates(name, candidates, limit):
+    """Candidates that safe_string_compare accepts as the same name, best ratio first. Blocking."""
+    from rapidfuzz import fuzz
+
+    query = " ".join(name_tokens(name))
+    matches = []
+    for candidate in candidates:
+        if safe_string_compare(query, candidate["_id"], "name"):
+            matches.append({
+                "name": candidate.get("name", candidate["_id"]),
+                "normalized": candidate["_id"],
+                "score": round(fuzz.token_sort_ratio(query, candidate["_id"]), 2),
+                "document_ids": [str(doc_id) for doc_id in candidate.get("doc_ids", [])],
+                "document_count": len(candidate.get("doc_ids", [])),
+            })
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return matches[:limit]
+
+
+async def find_candidates(collection, name, max_candidates=None):
+    """
+    Entries sharing at least one blocking key with name. Entries with the same sorted
+    tokens ("t:" key) are fetched first, so a common surname filling the phonetic blocks
+    can never push the exact name out of the max_candidates cut.
+    """
+    keys = blocking_keys(name)
+    if not keys:
+        return []
+    if max_candidates is None:
+        max_candidates = int(os.getenv("NAME_LOOKUP_MAX_CANDIDATES", "2000"))
+    token_keys = [key for key in keys if key.startswith("t:")]
+    phonetic_keys = [key for key in keys if not key.startswith("t:")]
+
+    cursor = collection.find({"keys": {"$in": token_keys}}, {"keys": 0}).limit(max_candidates)
+    candidates = await cursor.to_list(length=max_candidates)
+    remaining = max_candidates - len(candidates)
+    if phonetic_keys and remaining > 0:
+        seen = [candidate["_id"] for candidate in candidates]
+        cursor = collection.find({"keys": {"$in": phonetic_keys}, "_id": {"$nin": seen}}, {"keys": 0}).limit(remaining)
+        candidates += await cursor.to_list(length=remaining)
+    return candidates
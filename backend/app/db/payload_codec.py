@@ -0,0 +1,160 @@
+import os
+import zlib
+import bson
+from bson.binary import Binary
+from pymongo import UpdateOne
+from app.core.executors import run_blocking
+from app.core.jobs import ChunkedJob
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+# Large payload fields of uploadedJSON documents that may be stored compressed.
+# An encoded field looks like {"_codec": "zstd", "v": 1, "size": <bson bytes>, "data": Binary}
+# and is decoded only by the routes that actually read that field.
+PAYLOAD_FIELDS = ("raw_json", "original_bm_json", "parsed_addresses")
+CODEC_VERSION = 1
+
+def storage_codec():
+    """Codec for new writes from STORAGE_CODEC (zstd|zlib); None keeps plain BSON"""
+    codec = os.getenv("STORAGE_CODEC", "").lower()
+    if codec not in ("zstd", "zlib"):
+        return None
+    if codec == "zstd" and zstandard is None:
+        return "zlib"
+    return codec
+
+
+def is_encoded(value):
+    return isinstance(value, dict) and "_codec" in value and "data" in value
+
+
+def encode_payload(value, codec=None, min_bytes=None):
+    """Compressed envelope for value, or value itself when no codec is set or it is small"""
+    codec = codec or storage_codec()
+    if codec is None or value is None or is_encoded(value):
+        return value
+    if min_bytes is None:
+        min_bytes = int(os.getenv("STORAGE_CODEC_MIN_BYTES", str(16 * 1024)))
+
+    # Wrapped so lists and scalars (single-file uploads) encode as well
+    raw = bson.encode({"d": value})
+    if len(raw) < min_bytes:
+        return value
+    if codec == "zstd":
+        data = zstandard.ZstdCompressor(level=int(os.getenv("STORAGE_ZSTD_LEVEL", "6"))).compress(raw)
+    else:
+        data = zlib.compress(raw, 6)
+    return {"_codec": codec, "v": CODEC_VERSION, "size": len(raw), "data": Binary(data)}
+
+
+def decode_payload(value):
+    """Plain value of a stored payload field (either form)"""
+    if not is_encoded(value):
+        return value
+    codec = value["_codec"]
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed payloads")
+        raw = zstandard.ZstdDecompressor().decompress(bytes(value["data"]), max_output_size=value["size"])
+    elif codec == "zlib":
+        raw = zlib.decompress(bytes(value["data"]))
+    else:
+        raise ValueError(f"Unknown payload codec: {codec}")
+    return bson.decode(raw)["d"]
+
+
+def encode_payloads(document, codec=None):
+    """Encode the payload fields of a document about to be written, in place"""
+    for field in PAYLOAD_FIELDS:
+        if field in document:
+            document[field] = encode_payload(document[field], codec)
+    return document
+
+
+def decode_payloads(document, fields=PAYLOAD_FIELDS):
+    """Decode only the requested payload fields of a fetched document, in place"""
+    for field in fields:
+        if field in document:
+            document[field] = decode_payload(document[field])
+    return document
+
+
+def payload_projection(field, subpath=None):
+    """
+    Projection reading field.subpath from plain documents and the whole envelope
+    from encoded ones (a sub-path can't be projected out of compressed data)
+    """
+    if not subpath:
+        return {field: 1}
+    return {
+        f"{field}.{subpath}": 1,
+        f"{field}._codec": 1,
+        f"{field}.v": 1,
+        f"{field}.size": 1,
+        f"{field}.data": 1,
+    }
+
+
+def output_categories(raw_json):
+    """raw_json.finalisation category names, stored alongside so queries never need the payload"""
+    finalisation = raw_json.get("finalisation") if isinstance(raw_json, dict) else None
+    return list(finalisation.keys()) if isinstance(finalisation, dict) else []
+
+
+def _migration_update(doc, codec):
+    update = {}
+    for field in PAYLOAD_FIELDS:
+        if field in doc and not is_encoded(doc[field]):
+            encoded = encode_payload(doc[field], codec)
+            if encoded is not doc[field]:
+                update[field] = encoded
+    if "output_categories" not in doc:
+        update["output_categories"] = output_categories(decode_payload(doc.get("raw_json")))
+    return update
+
+
+PAYLOAD_COMPRESSION_JOB = "payload_compression"
+
+
+def payload_migration_job(collection, chunk_size=20):
+    """
+    Compresses stored payloads chunk by chunk (compression runs on the IO pool) with
+    the job's codec and backfills output_categories
+    """
+    projection = {"output_categories": 1, **{field: 1 for field in PAYLOAD_FIELDS}}
+
+    async def fetch_chunk(job, last_id, chunk_size):
+        query = {"$or": [{f"{field}._codec": {"$exists": False}} for field in PAYLOAD_FIELDS]
+                 + [{"output_categories": {"$exists": False}}]}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        return await collection.find(query, projection).sort("_id", 1).to_list(length=chunk_size)
+
+    async def process_chunk(job, docs):
+        ops = []
+        encoded_fields = 0
+        for doc in docs:
+            update = await run_blocking(_migration_update, doc, job["codec"])
+            if update:
+                encoded_fields += sum(1 for field in PAYLOAD_FIELDS if field in update)
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update, "$inc": {"revision": 1}}))
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+        return {"encoded_fields": encoded_fields}
+
+    return ChunkedJob(
+        PAYLOAD_COMPRESSION_JOB, "🗜️ Payload migration", ["encoded_fields"], fetch_chunk, process_chunk, chunk_size
+    )
+
+
+async def start_payload_migration(collection, job_collection, codec, chunk_size=20):
+    """Create a job record and compress existing documents in the background"""
+    return await payload_migration_job(collection, chunk_size).start(job_collection, codec=codec)
+
+
+async def resume_payload_migration(collection, job_collection, job_id, chunk_size=20):
+    """Continue an interrupted job from its checkpoint. Returns False if it can't be resumed."""
+    return await payload_migration_job(collection, chunk_size).resume(job_collection, job_id)
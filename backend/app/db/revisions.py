@@ -0,0 +1,11 @@
+async def bump_revision(revision_collection, name):
+    """Increment the change counter for a collection (used for list ETags)"""
+    try:
+        await revision_collection.update_one({"_id": name}, {"$inc": {"revision": 1}}, upsert=True)
+    except Exception as e:
+        print(f"⚠️ Could not bump revision for {name}: {e}")
+
+
+async def get_revision(revision_collection, name):
+    doc = await revision_collection.find_one({"_id": name})
+    return doc.get("revision", 0) if doc else 0
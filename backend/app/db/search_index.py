@@ -0,0 +1,247 @@
+import os
+import re
+from pymongo import ASCENDING
+from app.core.executors import run_blocking
+from app.core.jobs import ChunkedJob
+from app.db.name_index import borrower_names, replace_document_names
+from app.db.payload_codec import decode_payload
+from app.utils.columnar import finalisation_rows
+from app.validation.compare_strings import normalize
+from app.validation.field_matching import NON_FIELD_KEYS
+
+# Inverted index over finalisation label values (labelIndex collection). One entry per
+# distinct (source, category, filename, label, value) of an uploadedJSON document:
+#
+#   {"doc_id": ObjectId, "username": str, "document_name": str,
+#    "source": "input" | "output", "category": str, "filename": str,
+#    "label": "Borrower Name", "label_norm": "borrower name",
+#    "value": "John A. Smith", "norm": "john a smith", "tokens": ["a", "john", "smith"]}
+#
+# Entries of a document are replaced as a whole whenever the document is written and
+# removed with it, so the index never has to be diffed.
+
+SEARCH_MODES = ("exact", "prefix", "fuzzy")
+SEARCH_SOURCES = ("input", "output")
+
+# Stored values are truncated; label values longer than this are not search material
+MAX_VALUE_CHARS = 500
+# Fuzzy candidates share a token prefix of this length with the query
+FUZZY_PREFIX_CHARS = 3
+
+
+def _values(value):
+    if isinstance(value, list):
+        for item in value:
+            yield from _values(item)
+    elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        yield str(value)
+
+
+def _category_entries(source, category, rows):
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not isinstance(rows, list):
+        return
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        filename = row.get("filename", "")
+        for label, value in row.items():
+            if label in NON_FIELD_KEYS:
+                continue
+            for text in _values(value):
+                text = text.strip()[:MAX_VALUE_CHARS]
+                norm = normalize(text)
+                if not norm:
+                    continue
+                yield {
+                    "source": source,
+                    "category": category,
+                    "filename": filename,
+                    "label": label,
+                    "label_norm": normalize(label),
+                    "value": text,
+                    "norm": norm,
+                    "tokens": sorted(set(norm.split())),
+                }
+
+
+def label_value_entries(input_finalisation=None, output_finalisation=None):
+    """Index entries (without document fields) for an input and an output finalisation. Blocking."""
+    entries = {}
+    for source, finalisation in (("input", input_finalisation), ("output", output_finalisation)):
+        finalisation = finalisation_rows(finalisation)
+        if not isinstance(finalisation, dict):
+            continue
+        for category, rows in finalisation.items():
+            for entry in _category_entries(source, category, rows):
+                key = (source, category, entry["filename"], entry["label"], entry["norm"])
+                entries.setdefault(key, entry)
+    return list(entries.values())
+
+
+def document_entries(document):
+    """label_value_entries for a stored uploadedJSON document (either layout, either codec). Blocking."""
+    input_data = document.get("input_data")
+    input_finalisation = input_data.get("finalisation") if isinstance(input_data, dict) else None
+    raw_json = decode_payload(document.get("raw_json"))
+    output_finalisation = raw_json.get("finalisation") if isinstance(raw_json, dict) else None
+    return label_value_entries(input_finalisation, output_finalisation)
+
+
+async def ensure_search_indexes(collection):
+    await collection.create_index([("doc_id", ASCENDING)])
+    await collection.create_index([("norm", ASCENDING), ("label_norm", ASCENDING)])
+    await collection.create_index([("tokens", ASCENDING)])
+
+
+async def replace_document_entries(collection, doc_id, username, document_name, entries):
+    """Make entries the complete index of one document (re-uploads drop stale values)"""
+    await collection.delete_many({"doc_id": doc_id})
+    if entries:
+        await collection.insert_many(
+            [{**entry, "doc_id": doc_id, "username": username, "document_name": document_name} for entry in entries],
+            ordered=False,
+        )
+
+
+async def remove_document_entries(collection, doc_ids=None):
+    """Drop the entries of the given documents, or of every document when doc_ids is None"""
+    if doc_ids is None:
+        await collection.delete_many({})
+    elif doc_ids:
+        await collection.delete_many({"doc_id": {"$in": list(doc_ids)}})
+
+
+def _filters(label=None, category=None, source=None, username=None):
+    query = {}
+    if label:
+        query["label_norm"] = normalize(label)
+    if category:
+        query["category"] = category
+    if source:
+        query["source"] = source
+    if username:
+        query["username"] = username
+    return query
+
+
+def _hit(entry, score=100.0):
+    return {
+        "document_id": str(entry["doc_id"]),
+        "document_name": entry.get("document_name"),
+        "username": entry.get("username"),
+        "source": entry["source"],
+        "category": entry["category"],
+        "filename": entry.get("filename"),
+        "label": entry["label"],
+        "value": entry["value"],
+        "score": round(score, 2),
+    }
+
+
+_PROJECTION = {"tokens": 0, "label_norm": 0}
+
+
+async def search_label_values(collection, query, mode="exact", label=None, category=None,
+                              source=None, username=None, limit=50, threshold=80):
+    """
+    Label-value hits for query:
+
+    - exact:  normalized value equals the normalized query
+    - prefix: normalized value, or one of its tokens, starts with the normalized query
+    - fuzzy:  entries sharing a token (or a FUZZY_PREFIX_CHARS token prefix) with the
+              query, reranked with rapidfuzz and cut at threshold
+    """
+    norm = normalize(query)
+    if not norm:
+        return []
+    filters = _filters(label, category, source, username)
+
+    if mode == "exact":
+        cursor = collection.find({**filters, "norm": norm}, _PROJECTION).limit(limit)
+        return [_hit(entry) async for entry in cursor]
+
+    if mode == "prefix":
+        pattern = "^" + re.escape(norm)
+        cursor = collection.find(
+            {**filters, "$or": [{"norm": {"$regex": pattern}}, {"tokens": {"$regex": pattern}}]},
+            _PROJECTION,
+        ).limit(limit)
+        return [_hit(entry) async for entry in cursor]
+
+    # Fuzzy: index-backed blocking on tokens, then rerank the bounded candidate set.
+    # Entries sharing a whole token are fetched first; prefix blocks only fill what is
+    # left of max_candidates, so short common prefixes can't crowd out the best matches.
+    tokens = set(norm.split())
+    prefixes = {token[:FUZZY_PREFIX_CHARS] for token in tokens if len(token) >= FUZZY_PREFIX_CHARS}
+    max_candidates = int(os.getenv("SEARCH_FUZZY_MAX_CANDIDATES", "5000"))
+
+    cursor = collection.find({**filters, "tokens": {"$in": sorted(tokens)}}, _PROJECTION).limit(max_candidates)
+    candidates = await cursor.to_list(length=max_candidates)
+    remaining = max_candidates - len(candidates)
+    if prefixes and remaining > 0:
+        blocks = [{"tokens": {"$regex": "^" + re.escape(prefix)}} for prefix in sorted(prefixes)]
+        cursor = collection.find(
+            {**filters, "$or": blocks, "_id": {"$nin": [entry["_id"] for entry in candidates]}}, _PROJECTION
+        ).limit(remaining)
+        candidates += await cursor.to_list(length=remaining)
+
+    return await run_blocking(_rerank, norm, candidates, threshold, limit)
+
+
+def _rerank(norm, candidates, threshold, limit):
+    """Fuzzy hits among candidates, best first. Blocking."""
+    from rapidfuzz import fuzz
+
+    hits = []
+    for entry in candidates:
+        score = fuzz.WRatio(norm, entry["norm"])
+        if score >= threshold:
+            hits.append(_hit(entry, score))
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return hits[:limit]
+
+
+SEARCH_INDEX_JOB = "search_index_rebuild"
+
+
+def search_index_rebuild_job(upload_collection, search_collection, name_collection, chunk_size=20):
+    """
+    (Re)indexes label values and borrower names of stored documents chunk by chunk,
+    e.g. those uploaded before the indexes existed
+    """
+    projection = {"username": 1, "finalization_document_name": 1, "input_data.finalisation": 1, "raw_json": 1}
+
+    async def fetch_chunk(job, last_id, chunk_size):
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        return await upload_collection.find(query, projection).sort("_id", 1).to_list(length=chunk_size)
+
+    async def process_chunk(job, docs):
+        indexed_values = 0
+        for doc in docs:
+            entries = await run_blocking(document_entries, doc)
+            await replace_document_entries(
+                search_collection, doc["_id"], doc.get("username"), doc.get("finalization_document_name"), entries
+            )
+            await replace_document_names(name_collection, doc["_id"], borrower_names(entries))
+            indexed_values += len(entries)
+        return {"indexed_values": indexed_values}
+
+    return ChunkedJob(
+        SEARCH_INDEX_JOB, "🔎 Search index rebuild", ["indexed_values"], fetch_chunk, process_chunk, chunk_size
+    )
+
+
+async def start_search_index_rebuild(upload_collection, search_collection, name_collection, job_collection,
+                                     chunk_size=20):
+    """Create a job record and index existing documents in the background"""
+    job = search_index_rebuild_job(upload_collection, search_collection, name_collection, chunk_size)
+    return await job.start(job_collection)
+
+
+async def resume_search_index_rebuild(upload_collection, search_collection, name_collection, job_collection,
+                                      job_id, chunk_size=20):
+    """Continue an interrupted job from its checkpoint. Returns False if it can't be resumed."""
+    job = search_index_rebuild_job(upload_collection, search_collection, name_collection, chunk_size)
+    return await job.resume(job_collection, job_id)
@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from app.core.executors import OperationCancelled
+from app.utils.columnar import finalisation_rows
+from app.validation.address_store import AddressCanonicalStore
+from app.validation.compare_normalize_address import address_store, parse_address
+from app.validation.field_matching import NON_FIELD_KEYS, field_type_for_label
+
+# Ingest-time address parsing: every address-like label value of a loan is parsed once,
+# in parallel, before match results are computed. The records are stored on the document
+# as parsed_addresses ([{"address": key, **record}], a list because addresses contain dots)
+# and primed into address_store, so the address comparisons of compute_match_results read
+# the parsed components instead of running the usaddress CRF again. Addresses already in
+# the canonical store (ADDRESS_STORE_ENABLED) are not parsed again, and new ones are saved.
+
+_parse_pool = None
+_parse_lock = threading.Lock()
+
+
+def parse_workers():
+    """ADDRESS_PARSE_WORKERS processes (0 parses in the calling thread)"""
+    return int(os.getenv("ADDRESS_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def get_parse_pool():
+    global _parse_pool
+    with _parse_lock:
+        if _parse_pool is None:
+            # spawn: workers must not inherit the parent's Mongo client or threads
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=parse_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    with _parse_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _text(value):
+    # Same text compare_field compares
+    if isinstance(value, list):
+        return " ".join(str(v).strip() for v in value if v)
+    return "" if value is None else str(value).strip()
+
+
+def collect_addresses(*finalisations):
+    """
+    De-duplicated address_store keys of every address-like label value, in first-seen
+    order. List values contribute each item and their joined text (what compare_field sees).
+    """
+    keys = {}
+    for finalisation in finalisations:
+        finalisation = finalisation_rows(finalisation)
+        if not isinstance(finalisation, dict):
+            continue
+        for rows in finalisation.values():
+            for row in rows if isinstance(rows, list) else [rows]:
+                if not isinstance(row, dict):
+                    continue
+                for label, value in row.items():
+                    if label in NON_FIELD_KEYS or field_type_for_label(label) != "address":
+                        continue
+                    texts = [_text(value)]
+                    if isinstance(value, list):
+                        texts += [_text(item) for item in value]
+                    for text in texts:
+                        key = AddressCanonicalStore.cache_key(text)
+                        if key:
+                            keys.setdefault(key, None)
+    return list(keys)
+
+
+def parse_address_chunk(addresses):
+    """[{"address": key, **record}] for a chunk of keys; runs in a worker process"""
+    return [{"address": address, **parse_address(address)} for address in addresses]
+
+
+def parse_addresses(addresses, cancel=None, chunk_size=None):
+    """
+    Parsed records for address keys. Addresses already in address_store (its LRU or
+    the Mongo canonical store) are reused; the rest are chunked across the parse pool
+    and saved to the store. Blocking. Inside a worker process (CLI --workers) or with
+    ADDRESS_PARSE_WORKERS=0 it parses serially.
+    """
+    known = address_store.find_many(addresses)
+    parsed = [{**known[address], "address": address} for address in addresses if address in known]
+    missing = [address for address in addresses if address not in known]
+    if not missing:
+        return parsed
+    parsed_before = len(parsed)
+
+    chunk_size = chunk_size or int(os.getenv("ADDRESS_PARSE_CHUNK", "64"))
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+
+    if len(chunks) == 1 or parse_workers() <= 0 or multiprocessing.parent_process() is not None:
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled()
+            parsed.extend(parse_address_chunk(chunk))
+        _store(parsed[parsed_before:])
+        return parsed
+
+    futures = [get_parse_pool().submit(parse_address_chunk, chunk) for chunk in chunks]
+    for future in futures:
+        if cancel is not None and cancel.is_set():
+            for pending in futures:
+                pending.cancel()
+            raise OperationCancelled()
+        parsed.extend(future.result())
+    _store(parsed[parsed_before:])
+    return parsed
+
+
+def _store(records):
+    address_store.store_many({
+        record["address"]: {k: v for k, v in record.items() if k != "address"}
+        for record in records
+    })
+
+
+def prime_parsed_addresses(parsed_addresses):
+    """Load a document's parsed_addresses into address_store"""
+    if parsed_addresses:
+        address_store.prime({
+            record["address"]: {k: v for k, v in record.items() if k != "address"}
+            for record in parsed_addresses
+        })
+
+
+def parse_and_prime(*finalisations, cancel=None):
+    """collect_addresses + parse_addresses + prime; returns the parsed_addresses list. Blocking."""
+    parsed = parse_addresses(collect_addresses(*finalisations), cancel=cancel)
+    prime_parsed_addresses(parsed)
+    return parsed
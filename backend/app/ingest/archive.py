@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from app.core.executors import OperationCancelled
+from .transform import load_input_file
+
+# Encodings tried, in order, when decoding uploaded or on-disk JSON
+JSON_ENCODINGS = ["utf-8", "utf-8-sig", "windows-1252", "latin-1", "iso-8859-1"]
+
+# These helpers are blocking; call them through app.core.executors.run_blocking /
+# run_cancellable so archive work never runs on the event loop.
+
+
+class ArchiveRejected(ValueError):
+    """The archive exceeds the configured ZIP limits (likely a ZIP bomb)"""
+
+
+def zip_limits_from_env():
+    return {
+        "max_uncompressed_bytes": int(os.getenv("ZIP_MAX_UNCOMPRESSED_BYTES", str(2 * 1024 ** 3))),
+        "max_ratio": float(os.getenv("ZIP_MAX_RATIO", "200")),
+        "max_members": int(os.getenv("ZIP_MAX_MEMBERS", "50000")),
+    }
+
+
+# Members smaller than this are not ratio-checked (tiny files compress extremely well)
+_RATIO_MIN_BYTES = 1024 * 1024
+
+
+def check_zip_members(members, max_uncompressed_bytes, max_ratio, max_members):
+    """
+    Reject an archive from its central directory before anything is extracted.
+    zipfile never inflates a member past its declared file_size, so the declared
+    sizes bound what extraction can write.
+    """
+    if len(members) > max_members:
+        raise ArchiveRejected(f"ZIP has {len(members)} members (limit {max_members})")
+
+    total = 0
+    for member in members:
+        total += member.file_size
+        if total > max_uncompressed_bytes:
+            raise ArchiveRejected(f"ZIP uncompresses to more than {max_uncompressed_bytes} bytes")
+        if member.file_size >= _RATIO_MIN_BYTES and member.file_size > max_ratio * max(member.compress_size, 1):
+            raise ArchiveRejected(
+                f"ZIP member {member.filename} has compression ratio above {max_ratio:g}"
+            )
+
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled("Cancelled")
+
+
+def decode_json_bytes(content, encodings=JSON_ENCODINGS):
+    """Parse JSON bytes trying each encoding in turn; None if none works"""
+    for encoding in encodings:
+        try:
+            return json.loads(content.decode(encoding))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            continue
+    return None
+
+
+def read_json_file(path, encodings=JSON_ENCODINGS):
+    with open(path, "rb") as f:
+        return decode_json_bytes(f.read(), encodings)
+
+
+def extract_zip(source, dest_dir, cancel=None, limits=None):
+    """
+    Extract a ZIP (path or seekable file object) member by member, checking the
+    cancel event between members. Raises ArchiveRejected when the archive exceeds
+    limits (default: zip_limits_from_env()).
+    """
+    with zipfile.ZipFile(source, "r") as zip_ref:
+        members = zip_ref.infolist()
+        check_zip_members(members, **(limits or zip_limits_from_env()))
+        for member in members:
+            _check_cancel(cancel)
+            zip_ref.extract(member, dest_dir)
+
+
+def read_input_tree(root_dir, keep_original=True, cancel=None):
+    """
+    Walk an extracted input folder: <category>/<file>.json (files at the top level
+    go to "Uncategorized").
+
+    :return: (input_finalisation, original_bm_json) as stored on uploadedJSON documents
+    """
+    root_path = Path(root_dir)
+    input_finalisation = {}
+    original_bm_json = {}
+
+    for root, _, files in os.walk(root_dir):
+        for file in files:
+            if not file.endswith(".json"):
+                continue
+            _check_cancel(cancel)
+
+            file_path = Path(root) / file
+            parts = str(file_path.relative_to(root_path)).split(os.sep)
+            category = parts[0] if len(parts) > 1 else "Uncategorized"
+
+            try:
+                raw_json, transformed = load_input_file(file_path, keep_original)
+            except Exception as e:
+                print(f"⚠️ Could not read {file}: {e}")
+                continue
+
+            if keep_original:
+                original_bm_json.setdefault(category, []).append({"filename": file, "data": raw_json})
+
+            transformed["filename"] = file
+            input_finalisation.setdefault(category, []).append(transformed)
+            print(f"✅ Processed {category}/{file}")
+
+    return input_finalisation, original_bm_json
+
+
+def read_zip_inputs(source, keep_original=True, cancel=None, limits=None):
+    """Extract a ZIP into a temporary folder and read it with read_input_tree"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        extract_zip(source, temp_dir, cancel, limits)
+        print(f"✅ Extracted ZIP contents to: {temp_dir}")
+        return read_input_tree(temp_dir, keep_original, cancel)
+
+
+def move_replacing(src, dest):
+    """Move src to dest, replacing an existing dest (works across filesystems)"""
+    if os.path.exists(dest):
+        os.remove(dest)
+    shutil.move(src, dest)
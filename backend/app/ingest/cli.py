@@ -0,0 +1,184 @@
+"""
+Batch ingest from the command line (same pipeline as /batch_process).
+
+    python -m app.ingest.cli --input-folder .../source/input
+        --output-folder .../source/output --username batch --email batch@example.com
+        [--workers 4] [--dry-run] [--since 2024-01-31]
+
+With --workers N > 1, documents are built (ZIP extraction, transform, match
+precomputation) in N worker processes; the parent process does all Mongo writes
+and file moves. --dry-run builds documents but writes and moves nothing.
+"""
+import argparse
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+from app.core.executors import run_blocking, run_cancellable, shutdown_io_executor
+from app.validation.match_profiles import apply_match_profiles, load_match_profiles, profile_snapshot
+from .addresses import shutdown_parse_pool
+from .pipeline import (
+    BatchIngest, build_batch_document, build_batch_document_timed,
+    collections_from_env, make_processed_dirs, output_json_name_for, profile_collection_from_env,
+)
+
+
+def find_pairs(input_folder, output_folder, since=None):
+    """
+    (zip_path, output_json_path, size_bytes) for every ZIP with a matching output JSON,
+    plus the ZIP names that have none. since filters on ZIP modification time.
+    """
+    pairs, missing = [], []
+    with os.scandir(input_folder) as entries:
+        zip_entries = sorted((e for e in entries if e.is_file() and e.name.endswith(".zip")), key=lambda e: e.name)
+
+    for entry in zip_entries:
+        zip_stat = entry.stat()
+        if since is not None and zip_stat.st_mtime < since.timestamp():
+            continue
+        output_json_path = os.path.join(output_folder, output_json_name_for(entry.name))
+        try:
+            output_size = os.path.getsize(output_json_path)
+        except OSError:
+            missing.append(entry.name)
+            continue
+        pairs.append((entry.path, output_json_path, zip_stat.st_size + output_size))
+    return pairs, missing
+
+
+class IngestStats:
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.pairs = 0
+        self.files = 0
+        self.bytes = 0
+        self.failed = []
+
+    def add(self, timings, document, size_bytes):
+        for stage, seconds in timings.items():
+            self.stages[stage] += seconds
+        self.pairs += 1
+        self.files += document.get("total_input_files", 0)
+        self.bytes += size_bytes
+
+    def summary(self, elapsed, written, skipped):
+        elapsed = max(elapsed, 1e-9)
+        lines = [
+            f"📊 Pairs built: {self.pairs}, written: {written}, failed: {len(self.failed)}, skipped (no output JSON): {skipped}",
+            f"⏱️ {elapsed:.2f}s wall | {self.pairs / elapsed:.2f} pairs/s | "
+            f"{self.files / elapsed:.1f} input files/s | {self.bytes / elapsed / (1024 * 1024):.2f} MB/s",
+            "🧮 Stage time (summed over workers): " + ", ".join(
+                f"{stage} {seconds:.2f}s" for stage, seconds in self.stages.items()
+            ),
+        ]
+        for name, error in self.failed:
+            lines.append(f"❌ {name}: {error}")
+        return "\n".join(lines)
+
+
+async def _run(args):
+    since = datetime.fromisoformat(args.since) if args.since else None
+    input_folder = os.path.abspath(args.input_folder)
+    output_folder = os.path.abspath(args.output_folder)
+    keep_original = not args.no_original
+
+    pairs, missing = await run_blocking(find_pairs, input_folder, output_folder, since)
+    print(f"📦 {len(pairs)} pair(s) to ingest, {len(missing)} ZIP(s) without output JSON")
+
+    client, ingest = None, None
+    if not args.dry_run:
+        client, *collections = collections_from_env()
+        # Score with the thresholds set through the API, not the built-in defaults
+        await load_match_profiles(profile_collection_from_env(client))
+        processed_input, processed_output = await run_blocking(make_processed_dirs, input_folder)
+        ingest = BatchIngest(
+            *collections, args.username, args.email, processed_input, processed_output,
+            keep_original=keep_original,
+        )
+
+    pool = None
+    if args.workers > 1:
+        # spawn: workers must not inherit the parent's Mongo client or IO threads
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=apply_match_profiles,
+            initargs=(profile_snapshot(),),
+        )
+
+    loop = asyncio.get_running_loop()
+    stats = IngestStats()
+    in_flight = asyncio.Semaphore(max(2, args.workers * 2))
+    write_lock = asyncio.Lock()
+
+    async def build(zip_path, output_json_path):
+        if pool is None:
+            timings = {}
+            document, filter_keys = await run_cancellable(
+                build_batch_document, zip_path, output_json_path,
+                args.username, args.email, keep_original, timings=timings,
+            )
+            return document, filter_keys, timings
+        return await loop.run_in_executor(pool, functools.partial(
+            build_batch_document_timed, zip_path, output_json_path, args.username, args.email, keep_original,
+        ))
+
+    async def process(zip_path, output_json_path, size_bytes):
+        # The semaphore is held until the document is queued, so built documents never pile up
+        async with in_flight:
+            try:
+                document, filter_keys, timings = await build(zip_path, output_json_path)
+            except Exception as e:
+                stats.failed.append((os.path.basename(zip_path), str(e)))
+                return
+            stats.add(timings, document, size_bytes)
+            if ingest is not None:
+                async with write_lock:
+                    started = time.perf_counter()
+                    await ingest.add_document(zip_path, output_json_path, document, filter_keys)
+                    stats.stages["write"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    written = 0
+    try:
+        await asyncio.gather(*(process(*pair) for pair in pairs))
+        if ingest is not None:
+            flush_started = time.perf_counter()
+            await ingest.flush()
+            stats.stages["write"] += time.perf_counter() - flush_started
+            written = len(ingest.results["successful"])
+            stats.failed.extend((r["filename"], r["error"]) for r in ingest.results["failed"])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        shutdown_io_executor()
+        shutdown_parse_pool()
+        if client is not None:
+            client.close()
+
+    print(stats.summary(time.perf_counter() - started, written, len(missing)))
+    return 1 if stats.failed else 0
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Ingest ZIP + _final.json pairs outside the API server")
+    parser.add_argument("--input-folder", required=True)
+    parser.add_argument("--output-folder", required=True)
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--workers", type=int, default=1, help="Processes building documents (default 1: IO threads only)")
+    parser.add_argument("--dry-run", action="store_true", help="Build documents but write and move nothing")
+    parser.add_argument("--since", help="Only ZIPs modified at or after this ISO date/datetime")
+    parser.add_argument("--no-original", action="store_true", help="Don't keep original_bm_json (streamed parse)")
+    args = parser.parse_args(argv)
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
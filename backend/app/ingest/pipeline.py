@@ -0,0 +1,253 @@
+import os
+import time
+from datetime import datetime
+from app.core.executors import run_blocking, run_cancellable
+from app.db.bulk_writer import BulkUpsertBuffer
+from app.db.filter_keys import merge_filter_keys
+from app.db.name_index import borrower_names, replace_document_names
+from app.db.payload_codec import encode_payloads, output_categories
+from app.db.revisions import bump_revision
+from app.db.search_index import document_entries, replace_document_entries
+from app.utils.columnar import compact_finalisation
+from app.validation.field_matching import compute_match_results
+from .addresses import parse_and_prime
+from .archive import read_zip_inputs, read_json_file, move_replacing
+
+# Shared batch ingestion: /batch_process, the watch-folder daemon and the CLI all
+# pair <name>.zip with <name>_final.json and go through BatchIngest.
+
+OUTPUT_SUFFIX = "_final.json"
+
+
+def output_json_name_for(zip_filename):
+    return zip_filename.replace(".zip", "") + OUTPUT_SUFFIX
+
+
+def processed_dirs(input_folder_path):
+    """
+    Processed/input and Processed/output next to the source folders: two levels up
+    from .../source/input -> .../Processed/{input,output}
+    """
+    base_root = os.path.dirname(os.path.dirname(input_folder_path.rstrip("\\/")))
+    processed_root = os.path.join(base_root, "Processed")
+    return os.path.join(processed_root, "input"), os.path.join(processed_root, "output")
+
+
+def make_processed_dirs(input_folder_path):
+    """processed_dirs(), created if missing. Blocking."""
+    processed_input, processed_output = processed_dirs(input_folder_path)
+    os.makedirs(processed_input, exist_ok=True)
+    os.makedirs(processed_output, exist_ok=True)
+    return processed_input, processed_output
+
+
+def build_batch_document(zip_path, output_json_path, username, email, keep_original=True, cancel=None, timings=None):
+    """
+    Read one ZIP + output JSON pair into an uploadedJSON document. Blocking; run it
+    on the IO pool (or in a worker process).
+
+    :param timings: optional dict that receives per-stage seconds
+                    (read_inputs, read_output, parse_addresses, match)
+    :return: (document, filter_keys)
+    """
+    zip_filename = os.path.basename(zip_path)
+    base_name = zip_filename.replace(".zip", "")
+    timings = {} if timings is None else timings
+
+    started = time.perf_counter()
+    input_finalisation, original_bm_json = read_zip_inputs(zip_path, keep_original, cancel)
+    timings["read_inputs"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    output_json = read_json_file(output_json_path)
+    if output_json is None:
+        raise Exception("Could not decode output JSON")
+    output_finalisation = output_json.get("finalisation") if isinstance(output_json, dict) else None
+    timings["read_output"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parsed_addresses = parse_and_prime(input_finalisation, output_finalisation, cancel=cancel)
+    timings["parse_addresses"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    match_results = compute_match_results(input_finalisation, output_finalisation)
+    timings["match"] = time.perf_counter() - started
+
+    document = {
+        "username": username,
+        "email": email,
+        "finalization_document_name": base_name,
+        "original_filename": os.path.basename(output_json_path),
+        "input_data": {"finalisation": compact_finalisation(input_finalisation)},
+        "original_bm_json": original_bm_json,
+        "raw_json": output_json,
+        "upload_date": datetime.utcnow(),
+        "upload_type": "batch_zip",
+        "input_categories": list(input_finalisation.keys()),
+        "output_categories": output_categories(output_json),
+        "total_input_files": sum(len(v) for v in input_finalisation.values()),
+        "match_results": match_results,
+        "parsed_addresses": parsed_addresses,
+    }
+    encode_payloads(document)
+    filter_keys = list(input_finalisation.keys()) + (
+        list(output_finalisation.keys()) if isinstance(output_finalisation, dict) else []
+    )
+    return document, filter_keys
+
+
+def build_batch_document_timed(zip_path, output_json_path, username, email, keep_original=True):
+    """build_batch_document returning (document, filter_keys, timings); picklable for process pools"""
+    timings = {}
+    document, filter_keys = build_batch_document(
+        zip_path, output_json_path, username, email, keep_original, timings=timings
+    )
+    return document, filter_keys, timings
+
+
+class BatchIngest:
+    """
+    Queues batch documents into a BulkUpsertBuffer. Once a document is written its
+    ZIP and output JSON are moved to the Processed folders; flush() writes what is
+    pending, re-indexes the written documents' label values and borrower names (when
+    the search collections are given), then merges filter keys and bumps the
+    uploadedJSON revision once.
+
+    results collects {"successful", "failed", "skipped"} entries as in /batch_process.
+    move_failed holds the ZIP paths of pairs that were written but could not be moved.
+    """
+
+    def __init__(self, upload_collection, filter_key_collection, revision_collection,
+                 search_collection, name_collection, username, email,
+                 processed_input, processed_output,
+                 keep_original=True, max_ops=None, max_bytes=None):
+        self.username = username
+        self.email = email
+        self.processed_input = processed_input
+        self.processed_output = processed_output
+        self.keep_original = keep_original
+        self.filter_key_collection = filter_key_collection
+        self.revision_collection = revision_collection
+        self.upload_collection = upload_collection
+        self.search_collection = search_collection
+        self.name_collection = name_collection
+        self.results = {"successful": [], "failed": [], "skipped": []}
+        self.move_failed = set()
+        self._filter_keys = set()
+        self._written = 0
+        self._search_entries = {}  # document name -> label value entries, written but not indexed
+        self.writer = BulkUpsertBuffer(
+            upload_collection,
+            on_success=self._on_written,
+            on_error=self._on_write_failed,
+            max_ops=max_ops or int(os.getenv("BATCH_WRITE_MAX_OPS", "50")),
+            max_bytes=max_bytes or int(os.getenv("BATCH_WRITE_MAX_BYTES", str(32 * 1024 * 1024))),
+        )
+
+    async def _on_written(self, item):
+        # === MOVE FILES TO PROCESSED ===
+        dest_zip = os.path.join(self.processed_input, item["zip_filename"])
+        dest_json = os.path.join(self.processed_output, item["output_json_name"])
+
+        try:
+            await run_blocking(move_replacing, item["zip_path"], dest_zip)
+            await run_blocking(move_replacing, item["output_json_path"], dest_json)
+
+            print(f"📁 Moved ZIP → {dest_zip}")
+            print(f"📄 Moved JSON → {dest_json}")
+        except Exception as move_err:
+            print(f"⚠️ Move error for {item['zip_filename']}: {move_err}")
+            self.move_failed.add(item["zip_path"])
+
+        self._filter_keys.update(item["filter_keys"])
+        if item.get("search_entries") is not None:
+            self._search_entries[item["base_name"]] = item["search_entries"]
+        self._written += 1
+        self.results["successful"].append(
+            {"zip_file": item["zip_filename"], "output_file": item["output_json_name"], "document_name": item["base_name"]}
+        )
+
+    def _on_write_failed(self, item, error):
+        print(f"❌ Error saving {item['zip_filename']}: {error}")
+        self.results["failed"].append({"filename": item["zip_filename"], "error": error})
+
+    def skip(self, zip_filename, reason):
+        self.results["skipped"].append({"filename": zip_filename, "reason": reason})
+
+    def fail(self, zip_filename, error):
+        self.results["failed"].append({"filename": zip_filename, "error": str(error)})
+
+    async def add_document(self, zip_path, output_json_path, document, filter_keys):
+        """Queue an already-built document (see build_batch_document)"""
+        zip_filename = os.path.basename(zip_path)
+        base_name = document["finalization_document_name"]
+        search_entries = None
+        if self.search_collection is not None:
+            search_entries = await run_blocking(document_entries, document)
+        await self.writer.add(
+            {"username": self.username, "finalization_document_name": base_name},
+            {"$set": document, "$inc": {"revision": 1}},
+            {
+                "zip_path": zip_path,
+                "zip_filename": zip_filename,
+                "output_json_path": output_json_path,
+                "output_json_name": os.path.basename(output_json_path),
+                "base_name": base_name,
+                "filter_keys": filter_keys,
+                "search_entries": search_entries,
+            },
+        )
+
+    async def add_pair(self, zip_path, output_json_path):
+        """Build the document for one pair on the IO pool and queue it"""
+        document, filter_keys = await run_cancellable(
+            build_batch_document, zip_path, output_json_path,
+            self.username, self.email, self.keep_original,
+        )
+        await self.add_document(zip_path, output_json_path, document, filter_keys)
+
+    async def flush(self):
+        """Write pending documents; returns how many were written since the last flush"""
+        await self.writer.flush()
+        await self._index_written()
+        written, self._written = self._written, 0
+        keys, self._filter_keys = self._filter_keys, set()
+        await merge_filter_keys(self.filter_key_collection, keys)
+        if written:
+            await bump_revision(self.revision_collection, "uploadedJSON")
+        return written
+
+    async def _index_written(self):
+        # Upserts don't report the _id of matched documents, so look them up by name
+        pending, self._search_entries = self._search_entries, {}
+        if not pending:
+            return
+        cursor = self.upload_collection.find(
+            {"username": self.username, "finalization_document_name": {"$in": list(pending)}},
+            {"finalization_document_name": 1},
+        )
+        async for doc in cursor:
+            name = doc["finalization_document_name"]
+            try:
+                await replace_document_entries(self.search_collection, doc["_id"], self.username, name, pending[name])
+                if self.name_collection is not None:
+                    await replace_document_names(self.name_collection, doc["_id"], borrower_names(pending[name]))
+            except Exception as e:
+                print(f"⚠️ Search index update failed for {name}: {e}")
+
+
+def collections_from_env():
+    """
+    Motor client plus the collections batch ingestion writes to, for entry points
+    running outside the API (MONGODB_URL / DB_Name, as in main.py)
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL"))
+    db = client[os.getenv("DB_Name")]
+    return client, db["uploadedJSON"], db["filteredKey"], db["revisions"], db["labelIndex"], db["borrowerNames"]
+
+
+def profile_collection_from_env(client):
+    """matchProfiles collection of a collections_from_env() client (thresholds set through the API)"""
+    return client[os.getenv("DB_Name")]["matchProfiles"]
@@ -0,0 +1,129 @@
+import json
+import traceback
+
+
+def transform_input_json(raw_data):
+    """
+    Transform input JSON - Only Labels array data
+    - Single value: "LabelName": "Value"
+    - Multiple values: "LabelName": ["Value1", "Value2"]
+    """
+    try:
+        transformed = {}
+        
+        # Process Summary -> Labels ONLY
+        if "Summary" in raw_data and isinstance(raw_data["Summary"], list):
+            for summary_item in raw_data["Summary"]:
+                if "Labels" in summary_item and isinstance(summary_item["Labels"], list):
+                    for label in summary_item["Labels"]:
+                        # Keep original LabelName
+                        label_name = label.get("LabelName", "Unknown")
+                        
+                        # Get Values array
+                        values_array = label.get("Values", [])
+                        
+                        # Extract "Value" field from each object
+                        extracted_values = [
+                            v.get("Value", "") for v in values_array 
+                            if isinstance(v, dict)
+                        ]
+                        
+                        # Filter out empty values
+                        extracted_values = [v for v in extracted_values if v]
+                        
+                        # Store based on count
+                        if len(extracted_values) == 0:
+                            transformed[label_name] = ""
+                        elif len(extracted_values) == 1:
+                            transformed[label_name] = extracted_values[0]  # Single value as string
+                        else:
+                            transformed[label_name] = extracted_values  # Multiple values as array
+        
+        return transformed
+    except Exception as e:
+        print(f"Error transforming JSON: {e}")
+        traceback.print_exc()
+        return {}
+
+
+_LABEL_PREFIX = "Summary.item.Labels.item"
+_SCALAR_EVENTS = {"string", "number", "boolean", "null"}
+
+
+def _stream_labels(fp):
+    """
+    Incremental equivalent of transform_input_json over a binary file object.
+    Only Summary[*].Labels[*].LabelName / Values[*].Value are kept while parsing;
+    the full JSON tree is never built. Raises on malformed JSON.
+    """
+    try:
+        import ijson
+    except ImportError:
+        # Without ijson fall back to a full parse
+        return transform_input_json(json.load(fp))
+
+    transformed = {}
+    label_name, values, value = None, None, None
+
+    for prefix, event, data in ijson.parse(fp, use_float=True):
+        if not prefix.startswith(_LABEL_PREFIX):
+            continue
+        if prefix == _LABEL_PREFIX:
+            if event == "start_map":
+                label_name, values = "Unknown", []
+            elif event == "end_map":
+                if len(values) == 0:
+                    transformed[label_name] = ""
+                elif len(values) == 1:
+                    transformed[label_name] = values[0]
+                else:
+                    transformed[label_name] = values
+        elif prefix == _LABEL_PREFIX + ".LabelName":
+            if event in _SCALAR_EVENTS:
+                label_name = data
+        elif prefix == _LABEL_PREFIX + ".Values.item":
+            if event == "start_map":
+                value = ""
+            elif event == "end_map" and value:
+                values.append(value)
+        elif prefix == _LABEL_PREFIX + ".Values.item.Value":
+            if event in _SCALAR_EVENTS:
+                value = data
+
+    return transformed
+
+
+def transform_input_json_stream(fp):
+    """
+    Streaming transform_input_json for large BM files (binary file object in, same dict out)
+    """
+    try:
+        return _stream_labels(fp)
+    except Exception as e:
+        print(f"Error transforming JSON: {e}")
+        traceback.print_exc()
+        return {}
+
+
+def load_input_file(file_path, keep_original=True):
+    """
+    Read one input JSON file for ingestion.
+    Returns (raw_json, transformed). Without keep_original the file is streamed,
+    never fully decoded, and raw_json is None.
+    Raises if the file is not valid JSON.
+    """
+    if keep_original:
+        with open(file_path, "r", encoding="utf-8") as f:
+            raw_json = json.loads(f.read())
+        return raw_json, transform_input_json(raw_json)
+
+    with open(file_path, "rb") as f:
+        return None, _stream_labels(f)
+
+
+def load_input_stream(fp):
+    """
+    load_input_file(keep_original=False) for an open binary file object, e.g. a
+    spooled upload. Raises if the content is not valid JSON.
+    """
+    return None, _stream_labels(fp)
@@ -0,0 +1,48 @@
+import os
+from fastapi import HTTPException
+from .archive import decode_json_bytes
+from .transform import transform_input_json, load_input_stream
+
+# Starlette spools every multipart file to a temporary file (in memory only up to 1MB),
+# so uploads are read from upload.file on the IO pool instead of `await upload.read()`.
+
+
+def max_file_bytes():
+    return int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(256 * 1024 ** 2)))
+
+
+def max_request_bytes():
+    return int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(1024 ** 3)))
+
+
+def check_upload_sizes(*uploads):
+    """413 if any spooled upload is above UPLOAD_MAX_FILE_BYTES"""
+    limit = max_file_bytes()
+    for upload in uploads:
+        if upload is not None and upload.size is not None and upload.size > limit:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File {upload.filename} is {upload.size} bytes (limit {limit})",
+            )
+
+
+def read_upload_json(fileobj):
+    """Decode a spooled upload as JSON (None if no encoding works). Blocking."""
+    fileobj.seek(0)
+    return decode_json_bytes(fileobj.read())
+
+
+def load_input_upload(fileobj, keep_original=True):
+    """
+    load_input_file for a spooled upload: (raw_json, transformed). Without
+    keep_original the upload is streamed and raw_json is None. Blocking.
+    Raises ValueError if the upload is not valid JSON.
+    """
+    if keep_original:
+        raw_json = read_upload_json(fileobj)
+        if raw_json is None:
+            raise ValueError("Could not decode JSON")
+        return raw_json, transform_input_json(raw_json)
+
+    fileobj.seek(0)
+    return load_input_stream(fileobj)
@@ -0,0 +1,298 @@
+"""
+Watch-folder ingestion daemon.
+
+    python -m app.ingest.watcher --input-folder .../source/input
+        --output-folder .../source/output --username batch --email batch@example.com
+
+Pairs <name>.zip (input folder) with <name>_final.json (output folder) as they arrive and
+ingests them through the same pipeline as /batch_process, including the moves to Processed.
+Uses inotify on Linux and falls back to polling elsewhere (or with --polling).
+"""
+import argparse
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import time
+import traceback
+import zipfile
+from dotenv import load_dotenv
+from app.validation.match_profiles import load_match_profiles
+from .addresses import shutdown_parse_pool
+from .pipeline import (
+    BatchIngest, OUTPUT_SUFFIX, collections_from_env, make_processed_dirs, output_json_name_for,
+    profile_collection_from_env,
+)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatch:
+    """Minimal non-blocking inotify binding (ctypes, Linux only); raises OSError elsewhere"""
+
+    def __init__(self, folders):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._folders = {}
+        for folder in folders:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), _WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch failed for {folder}")
+            self._folders[wd] = folder
+
+    def read_paths(self):
+        """Paths with events since the last call (drains the queue)"""
+        paths = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return paths
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                start = offset + _EVENT_HEADER.size
+                name = data[start:start + length].rstrip(b"\0")
+                offset = start + length
+                if name and wd in self._folders:
+                    paths.add(os.path.join(self._folders[wd], os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class FolderWatcher:
+    """
+    Tracks candidate files until they are stable (size and mtime unchanged for
+    settle_seconds, so partially copied files are not picked up), then ingests
+    every ZIP whose output JSON is stable too.
+
+    A pair that fails to build, or is written but can't be moved to Processed, is not
+    retried until one of its files changes; a pair whose write failed (e.g. Mongo
+    unavailable) is retried once it has settled again. With a profile_collection,
+    match profiles are reloaded before every ingest round.
+    """
+
+    def __init__(self, collections, input_folder, output_folder, username, email,
+                 keep_original=True, settle_seconds=2.0, poll_interval=1.0, use_inotify=True,
+                 profile_collection=None):
+        self.collections = collections
+        self.profile_collection = profile_collection
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.username = username
+        self.email = email
+        self.keep_original = keep_original
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self._candidates = {}   # path -> (signature, stable_since)
+        self._failed = {}       # path -> signature at the time of failure
+        self._wake = asyncio.Event()
+        self._inotify = None
+        self.processed_input, self.processed_output = make_processed_dirs(input_folder)
+
+    def _wanted(self, path):
+        folder, name = os.path.split(path)
+        if folder == self.input_folder:
+            return name.endswith(".zip")
+        return folder == self.output_folder and name.endswith(OUTPUT_SUFFIX)
+
+    def _track(self, path):
+        if self._wanted(path) and path not in self._candidates:
+            self._candidates[path] = (None, time.monotonic())
+
+    def _scan(self):
+        for folder in (self.input_folder, self.output_folder):
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        self._track(entry.path)
+
+    def _on_inotify(self):
+        for path in self._inotify.read_paths():
+            self._track(path)
+        self._wake.set()
+
+    def _stable_paths(self):
+        """Refresh candidate signatures; returns the set of settled paths"""
+        now = time.monotonic()
+        stable = set()
+        for path, (signature, since) in list(self._candidates.items()):
+            current = _signature(path)
+            if current is None:
+                del self._candidates[path]
+                continue
+            if current != signature:
+                self._candidates[path] = (current, now)
+                continue
+            if self._failed.get(path) == current:
+                # Unchanged since it failed: stop tracking until it changes again
+                del self._candidates[path]
+                continue
+            if now - since >= self.settle_seconds:
+                stable.add(path)
+        return stable
+
+    async def _ingest_ready(self):
+        stable = self._stable_paths()
+        pairs = []
+        for zip_path in sorted(p for p in stable if p.startswith(self.input_folder + os.sep)):
+            json_path = os.path.join(self.output_folder, output_json_name_for(os.path.basename(zip_path)))
+            if json_path in stable:
+                pairs.append((zip_path, json_path))
+        if not pairs:
+            return
+
+        if self.profile_collection is not None:
+            try:
+                await load_match_profiles(self.profile_collection)
+            except Exception as e:
+                print(f"⚠️ Match profile reload failed, using the previous thresholds: {e}")
+        ingest = BatchIngest(
+            *self.collections, self.username, self.email,
+            self.processed_input, self.processed_output,
+            keep_original=self.keep_original,
+        )
+        started = time.perf_counter()
+        build_failed = set()
+        for zip_path, json_path in pairs:
+            print(f"📦 Ingesting {os.path.basename(zip_path)}")
+            try:
+                if not zipfile.is_zipfile(zip_path):
+                    raise Exception("Not a valid ZIP file")
+                await ingest.add_pair(zip_path, json_path)
+            except Exception as e:
+                print(f"❌ Error processing {os.path.basename(zip_path)}: {e}")
+                ingest.fail(os.path.basename(zip_path), e)
+                build_failed.add(zip_path)
+        try:
+            await ingest.flush()
+        except Exception as e:
+            print(f"❌ Flush failed, pending pairs will be retried: {e}")
+            traceback.print_exc()
+
+        now = time.monotonic()
+        for zip_path, json_path in pairs:
+            for path in (zip_path, json_path):
+                signature = self._candidates.pop(path, (None,))[0]
+                if not os.path.exists(path):
+                    self._failed.pop(path, None)
+                elif zip_path in build_failed or zip_path in ingest.move_failed:
+                    # Remember pairs that can't be built, or were written but couldn't be
+                    # moved (re-ingesting would only bump revisions), until a file changes
+                    self._failed[path] = signature
+                else:
+                    # Built but not written: retry after another settle period
+                    self._candidates[path] = (signature, now)
+
+        results = ingest.results
+        print(
+            f"✅ Ingested {len(results['successful'])} of {len(pairs)} pair(s) in "
+            f"{time.perf_counter() - started:.2f}s ({len(results['failed'])} failed)"
+        )
+
+    def _start_inotify(self):
+        if not self.use_inotify:
+            return
+        try:
+            self._inotify = InotifyWatch([self.input_folder, self.output_folder])
+        except OSError as e:
+            print(f"⚠️ inotify unavailable, polling every {self.poll_interval}s: {e}")
+            return
+        asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+        print("👀 Watching with inotify")
+
+    async def run(self):
+        self._start_inotify()
+        self._scan()
+        try:
+            while True:
+                # With inotify, sleep until an event arrives unless files are still settling
+                timeout = self.poll_interval if (self._inotify is None or self._candidates) else None
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                # One bad cycle (unreadable folder, Mongo outage) must not stop the daemon
+                try:
+                    if self._inotify is None:
+                        self._scan()
+                    await self._ingest_ready()
+                except Exception as e:
+                    print(f"❌ Watch cycle failed: {e}")
+                    traceback.print_exc()
+        finally:
+            if self._inotify is not None:
+                asyncio.get_running_loop().remove_reader(self._inotify.fd)
+                self._inotify.close()
+
+
+async def _run(args):
+    client, *collections = collections_from_env()
+    watcher = FolderWatcher(
+        collections,
+        os.path.abspath(args.input_folder),
+        os.path.abspath(args.output_folder),
+        args.username,
+        args.email,
+        keep_original=not args.no_original,
+        settle_seconds=args.settle,
+        poll_interval=args.poll_interval,
+        use_inotify=not args.polling,
+        profile_collection=profile_collection_from_env(client),
+    )
+    print(f"🚀 Watching {watcher.input_folder} and {watcher.output_folder}")
+    try:
+        await watcher.run()
+    finally:
+        shutdown_parse_pool()
+        client.close()
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Continuously ingest ZIP + _final.json pairs from watch folders")
+    parser.add_argument("--input-folder", required=True)
+    parser.add_argument("--output-folder", required=True)
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds a file must stay unchanged before ingest")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--polling", action="store_true", help="Poll instead of using inotify")
+    parser.add_argument("--no-original", action="store_true", help="Don't keep original_bm_json (streamed parse)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        print("👋 Watcher stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class AddressMatchRequest(BaseModel):
+    reference: str
+    candidates: List[str]
+    threshold: int = 85
+
+class MatchProfileUpdate(BaseModel):
+    fuzz_ratio: Optional[float] = None
+    jaro_winkler: Optional[float] = None
+    levenshtein_distance: Optional[int] = None
+    sequence_matcher: Optional[float] = None
+    min_votes: Optional[int] = None
+    fuzzy_address_threshold: Optional[float] = None
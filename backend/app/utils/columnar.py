@@ -0,0 +1,120 @@
+import os
+
+# Optional compact layout for one input_data.finalisation category:
+#
+#   rows:     [{"filename": "a.json", "Borrower Name": "X", ...}, ...]
+#   columnar: {"_layout": "columnar", "v": 1,
+#              "filename": ["a.json", ...],
+#              "labels": ["Borrower Name", ...],
+#              "values": [["X", ...], ...]}     # values[i] is the column of labels[i]
+#
+# Label names are stored once per category instead of once per document, and stay out
+# of key position (they may contain dots). A cell is None when the document has no such
+# label, so the row view round-trips exactly. Readers go through category_rows().
+
+COLUMNAR_LAYOUT = "columnar"
+COLUMNAR_VERSION = 1
+
+
+def columnar_enabled():
+    """New uploads are stored columnar when COLUMNAR_FINALISATION is set"""
+    return os.getenv("COLUMNAR_FINALISATION", "").lower() in ("1", "true", "yes")
+
+
+def is_columnar(category_data):
+    return isinstance(category_data, dict) and category_data.get("_layout") == COLUMNAR_LAYOUT
+
+
+def rows_to_columns(rows):
+    """Row list -> columnar category (label order: first appearance)"""
+    labels = {}
+    for row in rows:
+        for label in row:
+            if label != "filename" and label not in labels:
+                labels[label] = len(labels)
+
+    values = [[None] * len(rows) for _ in labels]
+    for row_idx, row in enumerate(rows):
+        for label, value in row.items():
+            if label != "filename":
+                values[labels[label]][row_idx] = value
+
+    return {
+        "_layout": COLUMNAR_LAYOUT,
+        "v": COLUMNAR_VERSION,
+        "filename": [row.get("filename", "") for row in rows],
+        "labels": list(labels),
+        "values": values,
+    }
+
+
+def columns_to_rows(columnar):
+    """Columnar category -> row list, identical to what was stored"""
+    labels = columnar.get("labels", [])
+    values = columnar.get("values", [])
+    rows = []
+    for row_idx, filename in enumerate(columnar.get("filename", [])):
+        row = {}
+        for label, column in zip(labels, values):
+            value = column[row_idx]
+            if value is not None:
+                row[label] = value
+        row["filename"] = filename
+        rows.append(row)
+    return rows
+
+
+def category_rows(category_data):
+    """Row view of a category in either layout (non-columnar data is returned unchanged)"""
+    if is_columnar(category_data):
+        return columns_to_rows(category_data)
+    return category_data
+
+
+def category_column(category_data, label):
+    """[(filename, value)] for one label without building rows"""
+    if is_columnar(category_data):
+        labels = category_data.get("labels", [])
+        if label not in labels:
+            return []
+        column = category_data["values"][labels.index(label)]
+        return [(f, v) for f, v in zip(category_data["filename"], column) if v is not None]
+
+    rows = [category_data] if isinstance(category_data, dict) else category_data
+    if not isinstance(rows, list):
+        return []
+    return [(row.get("filename", ""), row[label]) for row in rows if isinstance(row, dict) and label in row]
+
+
+def finalisation_rows(finalisation):
+    """Row view of a whole finalisation dict"""
+    if not isinstance(finalisation, dict):
+        return finalisation
+    return {category: category_rows(data) for category, data in finalisation.items()}
+
+
+def compact_finalisation(finalisation, min_rows=None):
+    """
+    Storage form of an input finalisation: categories with at least min_rows rows
+    (COLUMNAR_MIN_ROWS, default 2) become columnar when columnar_enabled().
+    """
+    if not columnar_enabled() or not isinstance(finalisation, dict):
+        return finalisation
+    if min_rows is None:
+        min_rows = int(os.getenv("COLUMNAR_MIN_ROWS", "2"))
+
+    compacted = {}
+    for category, rows in finalisation.items():
+        if isinstance(rows, list) and len(rows) >= min_rows and all(isinstance(r, dict) for r in rows):
+            compacted[category] = rows_to_columns(rows)
+        else:
+            compacted[category] = rows
+    return compacted
+
+
+def expand_document(document):
+    """Replace a columnar input_data.finalisation with its row view, in place (API responses)"""
+    input_data = document.get("input_data")
+    if isinstance(input_data, dict) and isinstance(input_data.get("finalisation"), dict):
+        input_data["finalisation"] = finalisation_rows(input_data["finalisation"])
+    return document
@@ -0,0 +1,49 @@
+import hashlib
+from fastapi import Response
+
+# Bump when the response representation changes without a data change
+ETAG_VERSION = 1
+
+
+def make_etag(*parts):
+    """Strong ETag from revision parts, e.g. make_etag(document_id, revision)"""
+    raw = ":".join(str(p) for p in (ETAG_VERSION, *parts))
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def _opaque(tag):
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    # CompressionMiddleware tags compressed representations as "<etag>-gzip" / "<etag>-br"
+    for suffix in ('-gzip"', '-br"'):
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def matching_etag(if_none_match, etag):
+    """The If-None-Match entry that matches etag (weak comparison, as RFC 9110 requires), or None"""
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    opaque = _opaque(etag)
+    return next((c.strip() for c in if_none_match.split(",") if _opaque(c) == opaque), None)
+
+
+def etag_matches(if_none_match, etag):
+    return matching_etag(if_none_match, etag) is not None
+
+
+def etag_headers(etag):
+    # Clients may cache, but must revalidate before reuse
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(etag, if_none_match=None):
+    """
+    304 for a matched If-None-Match. It carries the tag the client presented, so a cached
+    compressed representation ("<etag>-gzip") keeps the ETag it was stored under.
+    """
+    return Response(status_code=304, headers=etag_headers(matching_etag(if_none_match, etag) or etag))
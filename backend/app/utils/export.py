@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+from datetime import datetime
+from app.core.executors import run_blocking
+from app.db.payload_codec import PAYLOAD_FIELDS, is_encoded, decode_payloads, payload_projection
+from .columnar import category_rows
+
+# Columns of one exported label value (long format: one row per value)
+EXPORT_COLUMNS = [
+    "document_id", "finalization_document_name", "username", "upload_date",
+    "source", "category", "filename", "row", "label", "value",
+]
+
+EXPORT_SOURCES = {
+    "input": "input_data.finalisation",
+    "output": "raw_json.finalisation",
+}
+
+_FLUSH_BYTES = 64 * 1024
+
+
+def build_export_query(username=None, category=None, date_from=None, date_to=None, sources=("input", "output")):
+    """Mongo filter for an export request"""
+    query = {}
+    if username:
+        query["username"] = username
+    if date_from or date_to:
+        query["upload_date"] = {}
+        if date_from:
+            query["upload_date"]["$gte"] = date_from
+        if date_to:
+            query["upload_date"]["$lt"] = date_to
+    if category:
+        query["$or"] = [{f"{EXPORT_SOURCES[s]}.{category}": {"$exists": True}} for s in sources]
+        if "output" in sources:
+            # raw_json may be stored compressed; output_categories is always queryable
+            query["$or"].append({"output_categories": category})
+    return query
+
+
+def build_export_projection(category=None, sources=("input", "output")):
+    """Only metadata plus the requested finalisation sections are read from Mongo"""
+    projection = {"finalization_document_name": 1, "username": 1, "upload_date": 1}
+    for source in sources:
+        path = f"{EXPORT_SOURCES[source]}.{category}" if category else EXPORT_SOURCES[source]
+        field, _, subpath = path.partition(".")
+        if field in PAYLOAD_FIELDS:
+            projection.update(payload_projection(field, subpath))
+        else:
+            projection[path] = 1
+    return projection
+
+
+def _get_path(doc, dotted):
+    for part in dotted.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def iter_document_rows(doc, sources=("input", "output"), category=None, labels=None):
+    """Flatten one uploadedJSON document into export rows"""
+    meta = {
+        "document_id": str(doc["_id"]),
+        "finalization_document_name": doc.get("finalization_document_name", ""),
+        "username": doc.get("username", ""),
+        "upload_date": doc["upload_date"].isoformat() if isinstance(doc.get("upload_date"), datetime) else doc.get("upload_date"),
+    }
+
+    for source in sources:
+        finalisation = _get_path(doc, EXPORT_SOURCES[source])
+        if not isinstance(finalisation, dict):
+            continue
+        for category_name, items in finalisation.items():
+            if category and category_name != category:
+                continue
+            items = category_rows(items)
+            if isinstance(items, dict):
+                items = [items]
+            if not isinstance(items, list):
+                continue
+            for row_idx, item in enumerate(items):
+                if not isinstance(item, dict):
+                    continue
+                filename = item.get("filename", "")
+                for label, value in item.items():
+                    if label == "filename" or (labels and label not in labels):
+                        continue
+                    values = value if isinstance(value, list) else [value]
+                    for v in values or [""]:
+                        yield {
+                            **meta,
+                            "source": source,
+                            "category": category_name,
+                            "filename": filename,
+                            "row": row_idx,
+                            "label": label,
+                            "value": v if isinstance(v, (str, int, float, bool)) or v is None else json.dumps(v, default=str),
+                        }
+
+
+async def iter_export_rows(collection, query, projection, sources, category=None, labels=None, batch_size=50):
+    """Rows for every matching document, read through a batched cursor"""
+    cursor = collection.find(query, projection, batch_size=batch_size).sort("_id", 1)
+    async for doc in cursor:
+        if is_encoded(doc.get("raw_json")):
+            await run_blocking(decode_payloads, doc, ("raw_json",))
+        for row in iter_document_rows(doc, sources, category, labels):
+            yield row
+
+
+async def stream_ndjson(rows):
+    """Encode rows as NDJSON, yielding ~64KB chunks"""
+    buffer = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(row, default=str, ensure_ascii=False) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= _FLUSH_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+async def stream_csv(rows):
+    """Encode rows as CSV with a header line, yielding ~64KB chunks"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= _FLUSH_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
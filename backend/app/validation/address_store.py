@@ -0,0 +1,183 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+def mongo_collection_from_env(collection_name="addressCanonical"):
+    """
+    Sync pymongo collection for the canonical address store.
+    Only enabled when ADDRESS_STORE_ENABLED is set, so plain validation never needs a database.
+    """
+    if os.getenv("ADDRESS_STORE_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return None
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv("MONGODB_URL"), serverSelectionTimeoutMS=2000)
+    return client[os.getenv("DB_Name")][collection_name]
+
+
+class AddressCanonicalStore:
+    """
+    raw address -> parsed record (usaddress tags + canonical components).
+
+    An in-process LRU sits in front of an optional Mongo collection, so every address
+    is parsed once per deployment instead of once per comparison. Records carry a
+    version; entries written by an older version are treated as misses.
+    """
+
+    def __init__(self, parse_func, version, collection_factory=None, maxsize=20000):
+        self._parse = parse_func
+        self._version = version
+        self._collection_factory = collection_factory
+        self._collection = None
+        self._collection_ready = collection_factory is None
+        self._maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "store_hits": 0, "misses": 0, "store_errors": 0}
+
+    @staticmethod
+    def cache_key(address):
+        return " ".join(str(address).split())
+
+    def _get_collection(self):
+        if not self._collection_ready:
+            self._collection_ready = True
+            try:
+                self._collection = self._collection_factory()
+            except Exception as e:
+                print(f"⚠️ Address store disabled: {e}")
+                self._collection = None
+        return self._collection
+
+    def _load(self, key):
+        collection = self._get_collection()
+        if collection is None:
+            return None
+        try:
+            record = collection.find_one({"_id": key, "v": self._version}, {"_id": 0, "created_at": 0})
+        except Exception as e:
+            self._count("store_errors")
+            print(f"⚠️ Address store read failed: {e}")
+            return None
+        return record
+
+    def _save(self, key, record):
+        collection = self._get_collection()
+        if collection is None:
+            return
+        try:
+            collection.replace_one(
+                {"_id": key},
+                {**record, "created_at": datetime.utcnow()},
+                upsert=True,
+            )
+        except Exception as e:
+            self._count("store_errors")
+            print(f"⚠️ Address store write failed: {e}")
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _remember(self, key, record):
+        with self._lock:
+            self._cache[key] = record
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+
+    def get(self, address):
+        """
+        Parsed record for an address, parsing and persisting it on first sight.
+        Records are keyed and parsed by the whitespace-collapsed address, so an address
+        usaddress can't parse gets that collapsed text (not the original) as canonical.
+        """
+        key = self.cache_key(address)
+        with self._lock:
+            record = self._cache.get(key)
+            if record is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return record
+
+        record = self._load(key)
+        if record is not None:
+            self._count("store_hits")
+        else:
+            self._count("misses")
+            record = self._parse(key)
+            self._save(key, record)
+
+        self._remember(key, record)
+        return record
+
+    def peek(self, address):
+        """Cached record for an address, or None (never parses or reads the store)"""
+        with self._lock:
+            return self._cache.get(self.cache_key(address))
+
+    def find_many(self, addresses):
+        """
+        {key: record} for the addresses already parsed, from the LRU and then one store
+        query for the rest (never parses). Store hits are remembered in the LRU.
+        """
+        found, missing = {}, []
+        with self._lock:
+            for address in addresses:
+                key = self.cache_key(address)
+                record = self._cache.get(key)
+                if record is not None:
+                    self._cache.move_to_end(key)
+                    self.stats["hits"] += 1
+                    found[key] = record
+                else:
+                    missing.append(key)
+
+        collection = self._get_collection()
+        if collection is None or not missing:
+            return found
+        try:
+            cursor = collection.find({"_id": {"$in": missing}, "v": self._version}, {"created_at": 0})
+            for record in cursor:
+                key = record.pop("_id")
+                self._count("store_hits")
+                self._remember(key, record)
+                found[key] = record
+        except Exception as e:
+            self._count("store_errors")
+            print(f"⚠️ Address store read failed: {e}")
+        return found
+
+    def store_many(self, records):
+        """Remember freshly parsed {address: record} pairs and persist them in one bulk write"""
+        records = {self.cache_key(address): record for address, record in records.items() if record}
+        for key, record in records.items():
+            self._count("misses")
+            self._remember(key, record)
+
+        collection = self._get_collection()
+        if collection is None or not records:
+            return
+        from pymongo import ReplaceOne
+
+        now = datetime.utcnow()
+        try:
+            collection.bulk_write(
+                [ReplaceOne({"_id": key}, {**record, "created_at": now}, upsert=True) for key, record in records.items()],
+                ordered=False,
+            )
+        except Exception as e:
+            self._count("store_errors")
+            print(f"⚠️ Address store write failed: {e}")
+
+    def prime(self, records):
+        """Load already-parsed {address: record} pairs into the LRU (no store round-trip)"""
+        for address, record in records.items():
+            if record and record.get("v") == self._version:
+                self._remember(self.cache_key(address), record)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
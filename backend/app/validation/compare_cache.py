@@ -0,0 +1,157 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Memoization for safe_string_compare. Results are pure functions of the compared text,
+# the field type and the profile thresholds, so they are cached in two scopes:
+#
+# - process: one LRU shared by all threads (COMPARE_CACHE_SIZE entries, 0 disables)
+# - request: an LRU per request_scope() (COMPARE_CACHE_REQUEST_SIZE entries, 0 disables),
+#            entered by CompareCacheMiddleware for every HTTP request; run_blocking copies
+#            the context, so IO-pool work of the request shares it
+#
+# Lookups try the request scope first, then the process scope.
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU with hit/miss/eviction counters"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """(True, value) on a hit, (False, None) on a miss"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_process_cache = None
+_process_lock = threading.Lock()
+_request_cache = ContextVar("compare_request_cache", default=None)
+
+# Totals over finished request scopes
+_request_totals = {"requests": 0, "hits": 0, "misses": 0}
+_request_totals_lock = threading.Lock()
+
+
+def process_cache():
+    """The process-wide LRU, or None when COMPARE_CACHE_SIZE is 0"""
+    global _process_cache
+    if _process_cache is None:
+        with _process_lock:
+            if _process_cache is None:
+                _process_cache = LRUCache(int(os.getenv("COMPARE_CACHE_SIZE", "100000")))
+    return _process_cache if _process_cache.max_size > 0 else None
+
+
+def clear_process_cache():
+    cache = process_cache()
+    if cache is not None:
+        cache.clear()
+
+
+@contextmanager
+def request_scope(max_size=None):
+    """Per-request cache for the duration of the block (nested scopes reuse the outer one)"""
+    if max_size is None:
+        max_size = int(os.getenv("COMPARE_CACHE_REQUEST_SIZE", "10000"))
+    if max_size <= 0 or _request_cache.get() is not None:
+        yield _request_cache.get()
+        return
+
+    cache = LRUCache(max_size)
+    token = _request_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _request_cache.reset(token)
+        with _request_totals_lock:
+            _request_totals["requests"] += 1
+            _request_totals["hits"] += cache.hits
+            _request_totals["misses"] += cache.misses
+
+
+def memoize(key, compute):
+    """Cached compute() under key, looked up in the request scope and then the process scope"""
+    request_cache = _request_cache.get()
+    if request_cache is not None:
+        hit, value = request_cache.get(key)
+        if hit:
+            return value
+
+    shared = process_cache()
+    if shared is not None:
+        hit, value = shared.get(key)
+        if not hit:
+            value = compute()
+            shared.put(key, value)
+    else:
+        value = compute()
+
+    if request_cache is not None:
+        request_cache.put(key, value)
+    return value
+
+
+def cache_stats():
+    shared = process_cache()
+    with _request_totals_lock:
+        requests = dict(_request_totals)
+    lookups = requests["hits"] + requests["misses"]
+    requests["hit_rate"] = round(requests["hits"] / lookups, 4) if lookups else 0.0
+    return {
+        "process": shared.stats() if shared is not None else {"enabled": False},
+        "request": requests,
+    }
+
+
+class CompareCacheMiddleware:
+    """Runs every HTTP request inside a request_scope()"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with request_scope():
+            await self.app(scope, receive, send)
@@ -1,9 +1,9 @@
-import usaddress
-from rapidfuzz import fuzz
+# usaddress (CRF model) and rapidfuzz are imported inside the functions that use them,
+# so importing this module stays cheap; see app.validation.warmup for preloading
+from .address_store import AddressCanonicalStore, mongo_collection_from_env
 
-# Comprehensive normalization dictionaries
-STATE_NORMALIZE = {
-    # Full state names (lowercase)
+# Normalization dictionaries (case-folded keys: look up with value.lower())
+_STATE_NAMES = {
     'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR',
     'california': 'CA', 'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE',
     'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID',
@@ -17,99 +17,86 @@ STATE_NORMALIZE = {
     'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT',
     'vermont': 'VT', 'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV',
     'wisconsin': 'WI', 'wyoming': 'WY',
-    
-    # Abbreviations (lowercase)
-    'al': 'AL', 'ak': 'AK', 'az': 'AZ', 'ar': 'AR', 'ca': 'CA', 'co': 'CO',
-    'ct': 'CT', 'de': 'DE', 'fl': 'FL', 'ga': 'GA', 'hi': 'HI', 'id': 'ID',
-    'il': 'IL', 'in': 'IN', 'ia': 'IA', 'ks': 'KS', 'ky': 'KY', 'la': 'LA',
-    'me': 'ME', 'md': 'MD', 'ma': 'MA', 'mi': 'MI', 'mn': 'MN', 'ms': 'MS',
-    'mo': 'MO', 'mt': 'MT', 'ne': 'NE', 'nv': 'NV', 'nh': 'NH', 'nj': 'NJ',
-    'nm': 'NM', 'ny': 'NY', 'nc': 'NC', 'nd': 'ND', 'oh': 'OH', 'ok': 'OK',
-    'or': 'OR', 'pa': 'PA', 'ri': 'RI', 'sc': 'SC', 'sd': 'SD', 'tn': 'TN',
-    'tx': 'TX', 'ut': 'UT', 'vt': 'VT', 'va': 'VA', 'wa': 'WA', 'wv': 'WV',
-    'wi': 'WI', 'wy': 'WY',
-    
-    # Uppercase abbreviations
-    'AL': 'AL', 'AK': 'AK', 'AZ': 'AZ', 'AR': 'AR', 'CA': 'CA', 'CO': 'CO',
-    'CT': 'CT', 'DE': 'DE', 'FL': 'FL', 'GA': 'GA', 'HI': 'HI', 'ID': 'ID',
-    'IL': 'IL', 'IN': 'IN', 'IA': 'IA', 'KS': 'KS', 'KY': 'KY', 'LA': 'LA',
-    'ME': 'ME', 'MD': 'MD', 'MA': 'MA', 'MI': 'MI', 'MN': 'MN', 'MS': 'MS',
-    'MO': 'MO', 'MT': 'MT', 'NE': 'NE', 'NV': 'NV', 'NH': 'NH', 'NJ': 'NJ',
-    'NM': 'NM', 'NY': 'NY', 'NC': 'NC', 'ND': 'ND', 'OH': 'OH', 'OK': 'OK',
-    'OR': 'OR', 'PA': 'PA', 'RI': 'RI', 'SC': 'SC', 'SD': 'SD', 'TN': 'TN',
-    'TX': 'TX', 'UT': 'UT', 'VT': 'VT', 'VA': 'VA', 'WA': 'WA', 'WV': 'WV',
-    'WI': 'WI', 'WY': 'WY'
 }
+STATE_NORMALIZE = {**_STATE_NAMES, **{abbr.lower(): abbr for abbr in _STATE_NAMES.values()}}
 
-STREET_TYPE_NORMALIZE = {
-    # Full street types (lowercase)
+_STREET_TYPES = {
     'alley': 'ALY', 'avenue': 'AVE', 'boulevard': 'BLVD', 'circle': 'CIR',
     'court': 'CT', 'drive': 'DR', 'lane': 'LN', 'place': 'PL',
     'road': 'RD', 'street': 'ST', 'way': 'WAY', 'parkway': 'PKWY',
     'highway': 'HWY', 'terrace': 'TER', 'plaza': 'PLZ', 'square': 'SQ',
     'trail': 'TRL', 'point': 'PT', 'ridge': 'RDG', 'loop': 'LOOP',
     'park': 'PARK', 'expressway': 'EXPY', 'freeway': 'FWY',
-    
-    # Common abbreviations (lowercase)
-    'aly': 'ALY', 'ave': 'AVE', 'blvd': 'BLVD', 'cir': 'CIR', 'ct': 'CT',
-    'dr': 'DR', 'ln': 'LN', 'pl': 'PL', 'rd': 'RD', 'st': 'ST', 'wy': 'WAY',
-    'pkwy': 'PKWY', 'hwy': 'HWY', 'ter': 'TER', 'plz': 'PLZ', 'sq': 'SQ',
-    'trl': 'TRL', 'pt': 'PT', 'rdg': 'RDG', 'expy': 'EXPY', 'fwy': 'FWY',
-    
-    # Uppercase versions
-    'ALLEY': 'ALY', 'AVENUE': 'AVE', 'BOULEVARD': 'BLVD', 'CIRCLE': 'CIR',
-    'COURT': 'CT', 'DRIVE': 'DR', 'LANE': 'LN', 'PLACE': 'PL',
-    'ROAD': 'RD', 'STREET': 'ST', 'WAY': 'WAY', 'PARKWAY': 'PKWY',
-    'HIGHWAY': 'HWY', 'TERRACE': 'TER', 'PLAZA': 'PLZ', 'SQUARE': 'SQ',
-    'TRAIL': 'TRL', 'POINT': 'PT', 'RIDGE': 'RDG', 'LOOP': 'LOOP',
-    'PARK': 'PARK', 'EXPRESSWAY': 'EXPY', 'FREEWAY': 'FWY',
-    
-    # Uppercase abbreviations
-    'ALY': 'ALY', 'AVE': 'AVE', 'BLVD': 'BLVD', 'CIR': 'CIR', 'CT': 'CT',
-    'DR': 'DR', 'LN': 'LN', 'PL': 'PL', 'RD': 'RD', 'ST': 'ST', 'WY': 'WAY',
-    'PKWY': 'PKWY', 'HWY': 'HWY', 'TER': 'TER', 'PLZ': 'PLZ', 'SQ': 'SQ',
-    'TRL': 'TRL', 'PT': 'PT', 'RDG': 'RDG', 'EXPY': 'EXPY', 'FWY': 'FWY'
+}
+STREET_TYPE_NORMALIZE = {
+    **_STREET_TYPES,
+    **{abbr.lower(): abbr for abbr in _STREET_TYPES.values()},
+    'wy': 'WAY',
 }
 
-DIRECTION_NORMALIZE = {
-    # Full directions (lowercase)
+_DIRECTIONS = {
     'north': 'N', 'south': 'S', 'east': 'E', 'west': 'W',
     'northeast': 'NE', 'northwest': 'NW', 'southeast': 'SE', 'southwest': 'SW',
-    
-    # Single letter abbreviations (lowercase)
-    'n': 'N', 's': 'S', 'e': 'E', 'w': 'W',
-    'ne': 'NE', 'nw': 'NW', 'se': 'SE', 'sw': 'SW',
-    
-    # Uppercase versions
-    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
-    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW',
-    
-    # Uppercase abbreviations
-    'N': 'N', 'S': 'S', 'E': 'E', 'W': 'W',
-    'NE': 'NE', 'NW': 'NW', 'SE': 'SE', 'SW': 'SW'
 }
+DIRECTION_NORMALIZE = {**_DIRECTIONS, **{abbr.lower(): abbr for abbr in _DIRECTIONS.values()}}
 
-def normalize_address_components(address):
-    """Parse address and normalize components for comparison"""
-    try:
-        parsed = usaddress.tag(address)[0]
-    except:
-        # If parsing fails, return original address as string
-        return str(address)
-    
-    # Extract and normalize components
-    components = {
+COMPONENT_KEYS = ['number', 'pre_direction', 'street_name', 'street_type', 'post_direction', 'city', 'state', 'zip']
+
+# Bump when tables or component rules change so persisted canonical forms are recomputed
+CANONICAL_VERSION = 1
+
+
+def _lookup(table, value):
+    value = value.strip()
+    return table.get(value.lower(), value)
+
+def components_from_tags(parsed):
+    """Normalize usaddress tags into comparison components"""
+    return {
         'number': parsed.get('AddressNumber', '').strip(),
-        'pre_direction': DIRECTION_NORMALIZE.get(parsed.get('StreetNamePreDirectional', ''), parsed.get('StreetNamePreDirectional', '')),
+        'pre_direction': _lookup(DIRECTION_NORMALIZE, parsed.get('StreetNamePreDirectional', '')),
         'street_name': parsed.get('StreetName', '').strip(),
-        'street_type': STREET_TYPE_NORMALIZE.get(parsed.get('StreetNamePostType', ''), parsed.get('StreetNamePostType', '')),
-        'post_direction': DIRECTION_NORMALIZE.get(parsed.get('StreetNamePostDirectional', ''), parsed.get('StreetNamePostDirectional', '')),
+        'street_type': _lookup(STREET_TYPE_NORMALIZE, parsed.get('StreetNamePostType', '')),
+        'post_direction': _lookup(DIRECTION_NORMALIZE, parsed.get('StreetNamePostDirectional', '')),
         'city': parsed.get('PlaceName', '').strip().replace(',', '').strip(),
-        'state': STATE_NORMALIZE.get(parsed.get('StateName', ''), parsed.get('StateName', '')),
+        'state': _lookup(STATE_NORMALIZE, parsed.get('StateName', '')),
         'zip': parsed.get('ZipCode', '').strip()
     }
-    
-    return components
+
+def parse_address(address):
+    """Parse one address into a canonical-store record (uncached)"""
+    import usaddress
+
+    try:
+        tags, address_type = usaddress.tag(address)
+    except:
+        # If parsing fails, the canonical form is the original address string
+        return {"v": CANONICAL_VERSION, "tags": None, "address_type": None,
+                "components": None, "canonical": str(address)}
+
+    components = components_from_tags(tags)
+    return {
+        "v": CANONICAL_VERSION,
+        "tags": dict(tags),
+        "address_type": address_type,
+        "components": components,
+        "canonical": components_to_string(components),
+    }
+
+# Process-wide canonical address store (LRU, optionally backed by Mongo)
+address_store = AddressCanonicalStore(
+    parse_address,
+    version=CANONICAL_VERSION,
+    collection_factory=mongo_collection_from_env,
+)
+
+def normalize_address_components(address):
+    """Parse address and normalize components for comparison"""
+    components = address_store.get(address)["components"]
+    if components is None:
+        # If parsing fails, return original address as string
+        return str(address)
+    return dict(components)
 
 def components_to_string(components):
     """Convert normalized components to a single string for fuzzy matching"""
@@ -118,24 +105,30 @@ def components_to_string(components):
     
     # Build string from components, filtering out empty values
     parts = []
-    for key in ['number', 'pre_direction', 'street_name', 'street_type', 'post_direction', 'city', 'state', 'zip']:
+    for key in COMPONENT_KEYS:
         value = str(components.get(key, '')).strip()
         if value:
             parts.append(value)
     
     return ' '.join(parts)
 
+def canonical_address_string(address):
+    """Canonical comparison string for an address (a cache lookup after first sight)"""
+    return address_store.get(address)["canonical"]
+
 
 def fuzzy_address_match(addr1, addr2, threshold=85):
     """Compare addresses using fuzzy string matching"""
+    return fuzzy_address_score(addr1, addr2) >= threshold
+
+def fuzzy_address_score(addr1, addr2):
+    """Best of ratio, token sort and token set ratio (0-100) of the canonical address strings"""
+    from rapidfuzz import fuzz
+
     try:
-        # Normalize both addresses
-        norm1 = normalize_address_components(addr1)
-        norm2 = normalize_address_components(addr2)
-        
-        # Convert to strings for fuzzy matching
-        str1 = components_to_string(norm1)
-        str2 = components_to_string(norm2)
+        # Canonical strings for both addresses (parsed once, then cached)
+        str1 = canonical_address_string(addr1)
+        str2 = canonical_address_string(addr2)
         
         print(f"Normalized string 1: '{str1}'")
         print(f"Normalized string 2: '{str2}'")
@@ -151,11 +144,83 @@ def fuzzy_address_match(addr1, addr2, threshold=85):
         print(f"Ratio: {ratio}, Token Sort: {token_sort_ratio}, Token Set: {token_set_ratio}")
         print(f"Best Ratio: {best_ratio}")
         
-        return best_ratio >= threshold
+        return best_ratio
         
     except Exception as e:
         print(f"Error in fuzzy matching: {e}")
-        return False
+        return 0.0
+
+AGREEMENT_KEYS = ['number', 'street', 'city', 'state', 'zip']
+
+def _street_key(components):
+    parts = [components.get(k, '') for k in ('pre_direction', 'street_name', 'street_type', 'post_direction')]
+    return ' '.join(p for p in parts if p).lower()
+
+def component_agreement(components1, components2):
+    """
+    Per-component agreement between two normalized component dicts.
+    Each value is True/False, or None when either side lacks that component.
+    """
+    if not isinstance(components1, dict) or not isinstance(components2, dict):
+        return dict.fromkeys(AGREEMENT_KEYS)
+
+    pairs = {
+        'number': (components1.get('number', ''), components2.get('number', '')),
+        'street': (_street_key(components1), _street_key(components2)),
+        'city': (components1.get('city', '').lower(), components2.get('city', '').lower()),
+        'state': (components1.get('state', ''), components2.get('state', '')),
+        'zip': (components1.get('zip', '')[:5], components2.get('zip', '')[:5]),
+    }
+    return {key: (a == b if a and b else None) for key, (a, b) in pairs.items()}
+
+def match_address_against_many(reference, candidates, threshold=85):
+    """
+    Scores many candidate addresses against one reference address.
+
+    The reference is parsed once and each distinct candidate once (via the canonical
+    address store). Every scorer used by fuzzy_address_match runs as one rapidfuzz
+    cdist over all candidates, and the best of the three is the score.
+
+    is_match is the same decision safe_string_compare(..., field_type="address") makes,
+    with threshold as the fuzzy_address_threshold: a score at or above threshold, or
+    else the majority vote of compare_strings_similarity under the address profile.
+
+    :param reference: Address to match against (e.g. the note's property address)
+    :param candidates: List of document addresses
+    :param threshold: Minimum score for a fuzzy match (same scale as fuzzy_address_match)
+    :return: list of {index, address, normalized, score, is_match, components}, best first
+    """
+    import numpy as np
+    from rapidfuzz import fuzz, process
+    from .compare_strings import compare_strings_similarity
+
+    reference_record = address_store.get(reference)
+    records = [address_store.get(candidate) for candidate in candidates]
+    choices = [record["canonical"] for record in records]
+
+    scores = np.zeros(len(choices))
+    if reference_record["canonical"] and choices:
+        scores = np.maximum.reduce([
+            process.cdist([reference_record["canonical"]], choices, scorer=scorer)[0]
+            for scorer in (fuzz.ratio, fuzz.token_sort_ratio, fuzz.token_set_ratio)
+        ])
+
+    results = []
+    for idx, candidate in enumerate(candidates):
+        score = float(scores[idx])
+        is_match = score >= threshold
+        if not is_match and reference and candidate:
+            is_match = compare_strings_similarity(reference, candidate, "address")["match_decision"]
+        results.append({
+            "index": idx,
+            "address": candidate,
+            "normalized": choices[idx],
+            "score": round(score, 2),
+            "is_match": is_match,
+            "components": component_agreement(reference_record["components"], records[idx]["components"]),
+        })
+    results.sort(key=lambda r: (-r["score"], r["index"]))
+    return results
 
 '''
 # Test the functions
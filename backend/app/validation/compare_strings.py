@@ -1,7 +1,7 @@
-from rapidfuzz import fuzz
-from rapidfuzz.distance import JaroWinkler, Levenshtein
-from difflib import SequenceMatcher
-from .compare_normalize_address import fuzzy_address_match  # ✅ ONLY CHANGE: Added dot
+# rapidfuzz and difflib are imported where they are used, keeping this module
+# (and MATCH_PROFILES) cheap to import at API startup
+from .compare_normalize_address import fuzzy_address_score  # ✅ ONLY CHANGE: Added dot
+from .compare_cache import memoize
 import re
 
 def normalize(text):
@@ -32,6 +32,8 @@ def loose_name_match(name1, name2):
         return True
 
     # Rule 3 (optional): majority fuzzy match of tokens (80+ threshold)
+    from rapidfuzz import fuzz
+
     matched = 0
     for t1 in tokens1:
         for t2 in tokens2:
@@ -40,39 +42,59 @@ def loose_name_match(name1, name2):
                 break  # move to next t1
     return matched >= min(len(tokens1), len(tokens2))  # majority match
 
-def compare_strings_similarity(str1, str2, field_type="default"):
+# Matching profiles: thresholds per field type.
+# "version" must be bumped whenever a threshold changes, so stored match results
+# produced by an older profile can be found and re-validated.
+MATCH_PROFILES = {
+    "name": {
+        "version": 1,
+        "fuzz_ratio": 85,
+        "jaro_winkler": 0.90,
+        "levenshtein_distance": 2,
+        "sequence_matcher": 0.85,
+        "min_votes": 3,
+    },
+    "address": {
+        "version": 1,
+        "fuzz_ratio": 80,              # lowered for abbreviation noise
+        "jaro_winkler": 0.88,
+        "levenshtein_distance": 10,    # allow more edits
+        "sequence_matcher": 0.85,
+        "min_votes": 3,
+        "fuzzy_address_threshold": 85,
+    },
+    "default": {
+        "version": 1,
+        "fuzz_ratio": 85,
+        "jaro_winkler": 0.85,
+        "levenshtein_distance": 3,
+        "sequence_matcher": 0.85,
+        "min_votes": 3,
+    },
+}
+
+def profile_versions():
+    """{field_type: version} of the active matching profiles"""
+    return {field_type: profile["version"] for field_type, profile in MATCH_PROFILES.items()}
+
+def compare_strings_similarity(str1, str2, field_type="default", profile=None):
     """
     Compares two strings using various similarity metrics and returns a score summary and decision.
     
     :param str1: First string to compare
     :param str2: Second string to compare
     :param field_type: Type of field being compared (name, address, default)
+    :param profile: Thresholds to use instead of MATCH_PROFILES[field_type]
     :return: dict with similarity scores and final match decision
     """
+    from rapidfuzz import fuzz
+    from rapidfuzz.distance import JaroWinkler, Levenshtein
+    from difflib import SequenceMatcher
+
     str1_clean = normalize(str1)
     str2_clean = normalize(str2)
     
-    # Default thresholds
-    thresholds = {
-        "name": {
-            "fuzz_ratio": 85,
-            "jaro_winkler": 0.90,
-            "levenshtein_distance": 2,
-            "sequence_matcher": 0.85
-        },
-        "address": {
-            "fuzz_ratio": 80,              # lowered for abbreviation noise
-            "jaro_winkler": 0.88,
-            "levenshtein_distance": 10,    # allow more edits
-            "sequence_matcher": 0.85
-        },
-        "default": {
-            "fuzz_ratio": 85,
-            "jaro_winkler": 0.85,
-            "levenshtein_distance": 3,
-            "sequence_matcher": 0.85
-        }
-    }[field_type]
+    thresholds = profile or MATCH_PROFILES[field_type]
   
     # Compute similarity scores
     fuzz_score = fuzz.ratio(str1_clean, str2_clean)
@@ -88,7 +110,7 @@ def compare_strings_similarity(str1, str2, field_type="default"):
         seq_ratio >= thresholds["sequence_matcher"]
     ]
     
-    match_decision = votes.count(True) >= 3  # 3 out of 4 methods agree
+    match_decision = votes.count(True) >= thresholds.get("min_votes", 3)  # 3 out of 4 methods agree
 
     return {
         "fuzz_ratio": fuzz_score,
@@ -98,19 +120,52 @@ def compare_strings_similarity(str1, str2, field_type="default"):
         "match_decision": match_decision
     }
     
-def safe_string_compare(a, b, field_type="default"):
+def _cache_key(a, b, field_type, profile):
+    """
+    Key of a comparison. Names and defaults only ever see normalize()d text; address
+    matching parses the raw text, so only whitespace is collapsed there. The order of
+    a and b is kept: loose_name_match and SequenceMatcher are not symmetric.
+    """
+    if field_type == "address":
+        a, b = " ".join(str(a).split()), " ".join(str(b).split())
+    else:
+        a, b = normalize(a), normalize(b)
+    return field_type, tuple(sorted(profile.items())), a, b
+
+def safe_string_compare(a, b, field_type="default", profile=None):
+    return string_compare_details(a, b, field_type, profile)["match"]
+
+def string_compare_details(a, b, field_type="default", profile=None):
+    """
+    {"match": bool, "score": 0-100} of safe_string_compare: the decision and the score it
+    rests on (fuzz ratio of the metric vote, or the canonical address score when the
+    address fallback was consulted). Memoized; don't mutate the returned dict.
+    """
     if not a or not b:
-        return False
-    match_score = compare_strings_similarity(a, b, field_type)
+        return {"match": False, "score": 0.0}
+    profile = profile or MATCH_PROFILES[field_type]
+    return memoize(
+        _cache_key(a, b, field_type, profile),
+        lambda: _safe_string_compare(a, b, field_type, profile),
+    )
+
+def _safe_string_compare(a, b, field_type, profile):
+    match_score = compare_strings_similarity(a, b, field_type, profile)
+    details = {"match": match_score["match_decision"], "score": float(match_score["fuzz_ratio"])}
+    if details["match"]:
+        return details
     
     if field_type == "name":
-        return match_score["match_decision"] or loose_name_match(a, b)
+        details["match"] = loose_name_match(a, b)
     
     if field_type == "address":
-        return match_score["match_decision"] or fuzzy_address_match(a, b, threshold=85)
-        
+        address_score = fuzzy_address_score(a, b)
+        details = {
+            "match": address_score >= profile.get("fuzzy_address_threshold", 85),
+            "score": float(address_score),
+        }
         
-    return match_score["match_decision"]
+    return details
 
 def are_name_lists_fuzzy_matched(list1, list2):
     """
@@ -0,0 +1,173 @@
+from collections import namedtuple
+from functools import lru_cache
+from typing import NamedTuple
+
+# Declarative field extraction from a finalisation JSON ({"Summary": [skill blocks]}).
+#
+#   PLAN = ExtractionPlan("PropertyAddress", [
+#       FieldSpec("address", "Property Address", post=("flatten",)),
+#       FieldSpec("state", "Property State", groups=False, post=("flatten",)),
+#   ])
+#   record = PLAN.extract(content, skill="Note Extraction")   # record.address, record.state
+#
+# Every requested field is collected in one walk over the skill blocks, instead of one
+# get_*_label_value_any_depth scan per field. Per skill name the specs are compiled once
+# into a {label name: [spec index]} lookup.
+#
+# FieldSpec:
+#   name         record field name
+#   label        LabelName to match (case-insensitive)
+#   skill        SkillName; None uses the skill passed to extract()
+#   cardinality  "one": first non-empty value, like get_first_label_value_any_depth
+#                "many": every non-empty value, like get_all_label_values_any_depth
+#   groups       also search Groups > RecordLabels. groups=False follows
+#                get_label_value_any_depth: Labels/ChildLabels of the first matching
+#                skill block only
+#   post         post-processors applied in order: callables or names (flatten, strip,
+#                date, street, address, or registered in POSTPROCESSORS)
+#   default      value when nothing matched ("" for one, [] for many)
+
+FieldSpec = namedtuple(
+    "FieldSpec",
+    ["name", "label", "skill", "cardinality", "groups", "post", "default"],
+    defaults=(None, "one", True, (), None),
+)
+
+CARDINALITIES = ("one", "many")
+
+
+@lru_cache(maxsize=None)
+def _builtin_postprocessors():
+    # Imported on first use: utils builds its plans at import time
+    from .utils import flatten_to_string, standardize_date, extract_street_only
+    from .compare_normalize_address import canonical_address_string
+
+    return {
+        "flatten": flatten_to_string,
+        "strip": lambda value: value.strip() if isinstance(value, str) else value,
+        "date": standardize_date,
+        "street": extract_street_only,
+        "address": canonical_address_string,
+    }
+
+
+# Project-specific post-processors by name, checked before the built-in ones
+POSTPROCESSORS = {}
+
+
+def _resolve_post(post):
+    resolved = []
+    for step in post:
+        if callable(step):
+            resolved.append(step)
+        elif step in POSTPROCESSORS:
+            resolved.append(POSTPROCESSORS[step])
+        elif step in _builtin_postprocessors():
+            resolved.append(_builtin_postprocessors()[step])
+        else:
+            raise ValueError(f"Unknown post-processor: {step}")
+    return resolved
+
+
+def _value_text(val):
+    value = val.get("Value")
+    if not isinstance(value, str):
+        return ""
+    value = value.strip()
+    return "" if value.lower() == "n/a" else value
+
+
+def _key(name):
+    return (name or "").strip().lower()
+
+
+class ExtractionPlan:
+    """A set of FieldSpecs extracted together into a typed record (record_type)"""
+
+    def __init__(self, record_name, specs):
+        self.specs = tuple(FieldSpec(*spec) if not isinstance(spec, FieldSpec) else spec for spec in specs)
+        for spec in self.specs:
+            if spec.cardinality not in CARDINALITIES:
+                raise ValueError(f"{spec.name}: cardinality must be one of {CARDINALITIES}")
+        self.record_type = NamedTuple(record_name, [(spec.name, self._field_type(spec)) for spec in self.specs])
+        self._compiled = {}
+        self._post = None
+
+    @staticmethod
+    def _field_type(spec):
+        if spec.cardinality == "many" and not spec.post:
+            return list
+        return str
+
+    def _compile(self, skill):
+        """{skill key: {label key: [spec index]}} for a runtime skill name"""
+        compiled = self._compiled.get(skill)
+        if compiled is None:
+            compiled = {}
+            for idx, spec in enumerate(self.specs):
+                skill_key = _key(spec.skill or skill)
+                compiled.setdefault(skill_key, {}).setdefault(_key(spec.label), []).append(idx)
+            self._compiled[skill] = compiled
+        return compiled
+
+    def _walk(self, labels, wanted, values, closed, in_group):
+        for label in labels:
+            for idx in wanted.get(_key(label.get("LabelName")), ()):
+                spec = self.specs[idx]
+                if closed[idx] or (in_group and not spec.groups):
+                    continue
+                for val in label.get("Values", []):
+                    text = _value_text(val)
+                    if not text:
+                        continue
+                    if spec.cardinality == "many":
+                        values[idx].append(text)
+                    else:
+                        values[idx] = text
+                        closed[idx] = True
+                        break
+
+            for group in label.get("Groups", []):
+                self._walk(group.get("RecordLabels", []), wanted, values, closed, True)
+            self._walk(label.get("ChildLabels", []), wanted, values, closed, in_group)
+
+    def extract(self, data, skill=None, context=""):
+        """Record of every spec's (post-processed) value, from a single traversal of data"""
+        compiled = self._compile(skill)
+        values = [[] if spec.cardinality == "many" else None for spec in self.specs]
+        closed = [False] * len(self.specs)
+
+        try:
+            for block in data.get("Summary", []):
+                wanted = compiled.get(_key(block.get("SkillName")))
+                if not wanted:
+                    continue
+                self._walk(block.get("Labels", []), wanted, values, closed, False)
+                # groups=False specs only ever look at the first block of their skill
+                for indexes in wanted.values():
+                    for idx in indexes:
+                        if not self.specs[idx].groups:
+                            closed[idx] = True
+                if all(closed):
+                    break
+        except Exception as e:
+            from .utils import utils_logger
+            utils_logger.error(
+                f"Error running extraction plan '{self.record_type.__name__}'"
+                + (f" | Context: {context}" if context else "")
+                + f": {str(e)}"
+            )
+
+        if self._post is None:
+            self._post = [_resolve_post(spec.post) for spec in self.specs]
+
+        fields = []
+        for spec, value, post in zip(self.specs, values, self._post):
+            if not value and spec.default is not None:
+                value = spec.default
+            elif value is None:
+                value = ""
+            for step in post:
+                value = step(value)
+            fields.append(value)
+        return self.record_type(*fields)
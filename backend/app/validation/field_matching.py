@@ -0,0 +1,130 @@
+from datetime import datetime
+from app.utils.columnar import category_rows
+from .compare_strings import MATCH_PROFILES, string_compare_details, profile_versions
+
+# Keys of a finalisation row that are bookkeeping, not extracted fields
+NON_FIELD_KEYS = {"filename", "status", "error_message", "folder_name"}
+
+
+def field_type_for_label(label_name):
+    """Map a label name to the safe_string_compare field type"""
+    label = str(label_name).lower()
+    if "address" in label:
+        return "address"
+    if "name" in label or "borrower" in label:
+        return "name"
+    return "default"
+
+
+def _as_text(value):
+    if isinstance(value, list):
+        return " ".join(str(v).strip() for v in value if v)
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def _rows_by_filename(rows):
+    rows = category_rows(rows)
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not isinstance(rows, list):
+        return {}
+    return {row.get("filename", ""): row for row in rows if isinstance(row, dict)}
+
+
+def compare_field(input_value, output_value, field_type):
+    """Score and decision for one input-vs-output field pair, tagged with the profile version used"""
+    a, b = _as_text(input_value), _as_text(output_value)
+    profile = MATCH_PROFILES[field_type]
+    # One (memoized) comparison gives both the decision and the score it was based on
+    details = string_compare_details(a, b, field_type=field_type, profile=profile)
+    return {
+        "type": field_type,
+        "score": round(details["score"], 2),
+        "match": details["match"],
+        "v": profile["version"],
+    }
+
+
+def compute_match_results(input_finalisation, output_finalisation):
+    """
+    Compares input_data.finalisation against raw_json.finalisation once, at ingest time.
+
+    Rows are paired by category and filename, fields by label name; only labels with
+    a value on both sides are compared.
+
+    :return: {"computed_at", "profiles", "fields", "matched",
+              "categories": {category: [{"filename": str, "fields": {label: {type, score, match}}}]}}
+    """
+    results = {
+        "computed_at": datetime.utcnow(),
+        "profiles": profile_versions(),
+        "fields": 0,
+        "matched": 0,
+        "categories": {},
+    }
+    if not isinstance(input_finalisation, dict) or not isinstance(output_finalisation, dict):
+        return results
+
+    for category, input_rows in input_finalisation.items():
+        output_rows = _rows_by_filename(output_finalisation.get(category))
+        if not output_rows:
+            continue
+
+        for filename, input_row in _rows_by_filename(input_rows).items():
+            output_row = output_rows.get(filename)
+            if output_row is None:
+                continue
+
+            fields = {}
+            for label, input_value in input_row.items():
+                if label in NON_FIELD_KEYS or label not in output_row:
+                    continue
+                if not _as_text(input_value) or not _as_text(output_row[label]):
+                    continue
+                fields[label] = compare_field(input_value, output_row[label], field_type_for_label(label))
+
+            if fields:
+                results["categories"].setdefault(category, []).append({"filename": filename, "fields": fields})
+                results["fields"] += len(fields)
+                results["matched"] += sum(1 for f in fields.values() if f["match"])
+
+    return results
+
+
+def stale_field_types(match_results):
+    """Field types whose stored profile version differs from the active one"""
+    stored = (match_results or {}).get("profiles", {})
+    return {ft for ft, version in profile_versions().items() if stored.get(ft) != version}
+
+
+def revalidate_match_results(match_results, input_finalisation, output_finalisation):
+    """
+    Re-scores, in place, only the fields whose field type's profile changed since
+    match_results was computed. Returns the number of fields recomputed.
+    """
+    stale = stale_field_types(match_results)
+    if not stale:
+        return 0
+
+    recomputed = 0
+    for category, rows in match_results.get("categories", {}).items():
+        input_rows = _rows_by_filename((input_finalisation or {}).get(category))
+        output_rows = _rows_by_filename((output_finalisation or {}).get(category))
+        for row in rows:
+            input_row = input_rows.get(row["filename"], {})
+            output_row = output_rows.get(row["filename"], {})
+            for label, field in row["fields"].items():
+                if field["type"] not in stale or label not in input_row or label not in output_row:
+                    continue
+                row["fields"][label] = compare_field(input_row[label], output_row[label], field["type"])
+                recomputed += 1
+
+    match_results["matched"] = sum(
+        1 for rows in match_results.get("categories", {}).values()
+        for row in rows for f in row["fields"].values() if f["match"]
+    )
+    match_results["profiles"] = profile_versions()
+    match_results["computed_at"] = datetime.utcnow()
+    return recomputed
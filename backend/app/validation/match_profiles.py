@@ -0,0 +1,81 @@
+import asyncio
+import os
+from datetime import datetime
+from pymongo import ReturnDocument
+from .compare_strings import MATCH_PROFILES
+
+THRESHOLD_KEYS = {
+    "fuzz_ratio", "jaro_winkler", "levenshtein_distance",
+    "sequence_matcher", "min_votes", "fuzzy_address_threshold",
+}
+
+
+def _apply(field_type, doc):
+    # Swap in a new dict: readers on other threads keep a consistent (thresholds, version)
+    changes = {k: doc[k] for k in THRESHOLD_KEYS | {"version"} if k in doc}
+    MATCH_PROFILES[field_type] = {**MATCH_PROFILES[field_type], **changes}
+
+
+async def load_match_profiles(profile_collection):
+    """Apply persisted profiles over the built-in defaults (only when they are newer)"""
+    async for doc in profile_collection.find({}):
+        field_type = doc["_id"]
+        if field_type in MATCH_PROFILES and doc.get("version", 0) >= MATCH_PROFILES[field_type]["version"]:
+            _apply(field_type, doc)
+    return MATCH_PROFILES
+
+
+def profile_snapshot():
+    """Picklable copy of the active profiles (for worker processes)"""
+    return {field_type: dict(profile) for field_type, profile in MATCH_PROFILES.items()}
+
+
+def apply_match_profiles(snapshot):
+    """Apply a profile_snapshot() over this process's profiles (only when they are newer)"""
+    for field_type, doc in (snapshot or {}).items():
+        if field_type in MATCH_PROFILES and doc.get("version", 0) >= MATCH_PROFILES[field_type]["version"]:
+            _apply(field_type, doc)
+
+
+async def refresh_match_profiles(profile_collection, interval=None):
+    """
+    Reload persisted profiles every PROFILE_REFRESH_SECONDS (default 30) until cancelled,
+    so a PUT handled by another API worker applies in this process too
+    """
+    if interval is None:
+        interval = float(os.getenv("PROFILE_REFRESH_SECONDS", "30"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await load_match_profiles(profile_collection)
+        except Exception as e:
+            print(f"⚠️ Match profile refresh failed: {e}")
+
+
+async def update_match_profile(profile_collection, field_type, changes):
+    """
+    Changes thresholds of one field type and bumps its version atomically in Mongo.
+    Returns the new profile; unchanged values don't bump the version.
+    """
+    if field_type not in MATCH_PROFILES:
+        raise ValueError(f"Unknown field type: {field_type}")
+    unknown = set(changes) - THRESHOLD_KEYS
+    if unknown:
+        raise ValueError(f"Unknown thresholds: {sorted(unknown)}")
+
+    await load_match_profiles(profile_collection)
+    current = MATCH_PROFILES[field_type]
+    changes = {k: v for k, v in changes.items() if current.get(k) != v}
+    if not changes:
+        return dict(current)
+
+    await profile_collection.update_one(
+        {"_id": field_type}, {"$setOnInsert": dict(current)}, upsert=True
+    )
+    doc = await profile_collection.find_one_and_update(
+        {"_id": field_type},
+        {"$set": {**changes, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    _apply(field_type, doc)
+    return dict(MATCH_PROFILES[field_type])
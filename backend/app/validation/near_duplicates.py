@@ -0,0 +1,128 @@
+from collections import defaultdict
+from hashlib import blake2b
+from .compare_strings import normalize
+
+_MAX_HASH = (1 << 64) - 1
+
+
+def label_values_text(transformed):
+    """
+    Join the label values of a transform_input_json result into one comparable string.
+    Label names are left out so that unrelated documents of the same type don't look alike.
+    """
+    parts = []
+    for label_name in sorted(k for k in transformed if k != "filename"):
+        value = transformed[label_name]
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value if v)
+        elif value:
+            parts.append(str(value))
+    return normalize(" ".join(parts))
+
+
+def shingles(text, size=5):
+    """Character shingles of normalized text (robust to OCR character noise)"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(tokens, num_perm=64):
+    """
+    One-permutation MinHash: every shingle is hashed once and binned,
+    empty bins are filled from the next non-empty bin (rotation densification).
+    Returns None for documents without any shingles.
+    """
+    bins = [_MAX_HASH] * num_perm
+    for token in tokens:
+        h = int.from_bytes(blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        idx = h % num_perm
+        value = h // num_perm
+        if value < bins[idx]:
+            bins[idx] = value
+
+    filled = [i for i, v in enumerate(bins) if v != _MAX_HASH]
+    if not filled:
+        return None
+
+    signature = list(bins)
+    for i in range(num_perm):
+        if signature[i] == _MAX_HASH:
+            offset = 1
+            while bins[(i + offset) % num_perm] == _MAX_HASH:
+                offset += 1
+            signature[i] = bins[(i + offset) % num_perm] + offset
+    return tuple(signature)
+
+
+class _DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def find_near_duplicate_clusters(texts, threshold=90, num_perm=64, bands=16, shingle_size=5,
+                                 max_representatives=32):
+    """
+    Finds clusters of near-identical texts.
+
+    MinHash signatures are bucketed with LSH (bands x rows = num_perm); only texts that
+    share a bucket are verified with rapidfuzz. Within a bucket every member is compared
+    against one representative of each cluster found in it so far (a bucket may hold
+    several unrelated groups), and becomes a new representative when none matches.
+    At most max_representatives are kept per bucket, which bounds the work for buckets
+    of many distinct texts.
+
+    :param texts: list of normalized strings (see label_values_text)
+    :param threshold: rapidfuzz ratio (0-100) required to confirm a candidate pair
+    :param max_representatives: cap on the clusters a bucket member is verified against
+    :return: list of clusters (sorted index lists), only clusters with 2+ members
+    """
+    from rapidfuzz import fuzz
+
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands")
+    rows = num_perm // bands
+
+    buckets = defaultdict(list)
+    for idx, text in enumerate(texts):
+        signature = minhash_signature(shingles(text, shingle_size), num_perm)
+        if signature is None:
+            continue
+        for band in range(bands):
+            buckets[(band, signature[band * rows:(band + 1) * rows])].append(idx)
+
+    clusters = _DisjointSet(len(texts))
+    verified = set()
+    for members in buckets.values():
+        representatives = [members[0]]
+        for other in members[1:]:
+            matched = False
+            for anchor in representatives:
+                if clusters.find(anchor) == clusters.find(other):
+                    matched = True
+                    break
+                if (anchor, other) in verified:
+                    continue
+                verified.add((anchor, other))
+                if fuzz.ratio(texts[anchor], texts[other], score_cutoff=threshold):
+                    clusters.union(anchor, other)
+                    matched = True
+                    break
+            if not matched and len(representatives) < max_representatives:
+                representatives.append(other)
+
+    grouped = defaultdict(list)
+    for idx in range(len(texts)):
+        grouped[clusters.find(idx)].append(idx)
+    return [members for members in grouped.values() if len(members) > 1]
@@ -0,0 +1,86 @@
+from pymongo import UpdateOne
+from app.core.executors import run_blocking
+from app.core.jobs import ChunkedJob
+from app.db.payload_codec import decode_payload, payload_projection
+from app.ingest.addresses import prime_parsed_addresses
+from .compare_strings import profile_versions
+from .field_matching import compute_match_results, revalidate_match_results
+from .match_profiles import load_match_profiles
+
+def stale_documents_query():
+    """Documents whose match results are missing or were produced by an older profile"""
+    return {
+        "input_data.finalisation": {"$exists": True},
+        "$or": [{"match_results": {"$exists": False}}] + [
+            {f"match_results.profiles.{field_type}": {"$ne": version}}
+            for field_type, version in profile_versions().items()
+        ],
+    }
+
+
+def _rescore(doc):
+    """(match_results, fields recomputed) for one stored document. Blocking."""
+    input_finalisation = doc.get("input_data", {}).get("finalisation")
+    raw_json = decode_payload(doc.get("raw_json"))
+    output_finalisation = (raw_json or {}).get("finalisation")
+    # Address comparisons read the components parsed at ingest
+    prime_parsed_addresses(decode_payload(doc.get("parsed_addresses")))
+    match_results = doc.get("match_results")
+    if match_results:
+        return match_results, revalidate_match_results(match_results, input_finalisation, output_finalisation)
+    match_results = compute_match_results(input_finalisation, output_finalisation)
+    return match_results, match_results["fields"]
+
+
+REVALIDATION_JOB = "revalidation"
+_PROJECTION = {
+    "input_data.finalisation": 1,
+    "match_results": 1,
+    "parsed_addresses": 1,
+    **payload_projection("raw_json", "finalisation"),
+}
+
+
+def revalidation_job(collection, chunk_size=50, profile_collection=None):
+    """
+    Re-scores stored match results chunk by chunk, recomputing only fields whose
+    field type's profile changed. Profiles are reloaded from profile_collection
+    before every chunk, so updates made by other processes apply.
+    """
+
+    async def fetch_chunk(job, last_id, chunk_size):
+        if profile_collection is not None:
+            await load_match_profiles(profile_collection)
+        query = stale_documents_query()
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        return await collection.find(query, _PROJECTION).sort("_id", 1).to_list(length=chunk_size)
+
+    async def process_chunk(job, docs):
+        ops = []
+        fields_recomputed = 0
+        for doc in docs:
+            # Fuzzy metrics and address parsing are CPU work: keep them off the loop
+            match_results, recomputed = await run_blocking(_rescore, doc)
+            fields_recomputed += recomputed
+            ops.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"match_results": match_results}, "$inc": {"revision": 1}},
+            ))
+        await collection.bulk_write(ops, ordered=False)
+        return {"fields_recomputed": fields_recomputed}
+
+    return ChunkedJob(
+        REVALIDATION_JOB, "🔁 Revalidation", ["fields_recomputed"], fetch_chunk, process_chunk, chunk_size
+    )
+
+
+async def start_revalidation_job(collection, job_collection, chunk_size=50, profile_collection=None):
+    """Create a job record for the active profile versions and run it in the background"""
+    job = revalidation_job(collection, chunk_size, profile_collection)
+    return await job.start(job_collection, profiles=profile_versions())
+
+
+async def resume_revalidation_job(collection, job_collection, job_id, chunk_size=50, profile_collection=None):
+    """Continue an interrupted job from its checkpoint. Returns False if it can't be resumed."""
+    return await revalidation_job(collection, chunk_size, profile_collection).resume(job_collection, job_id)
@@ -4,12 +4,15 @@ import json
 from datetime import datetime
 import logging
 import os
-import usaddress
 from .compare_strings import (  # ✅ ONLY CHANGE: Added dot
     safe_string_compare  
 )
+from .near_duplicates import find_near_duplicate_clusters, label_values_text
+from .compare_normalize_address import address_store
+from .extraction_plan import ExtractionPlan, FieldSpec
+from app.ingest.transform import transform_input_json
     
-def get_logger(name="default"):
+def get_logs_dir():
     # Find project root (assumes utils.py is in unix_ic/modules)
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.abspath(os.path.join(current_dir, ".."))
@@ -17,6 +20,10 @@ def get_logger(name="default"):
     # Ensure logs directory exists
     logs_dir = os.path.join(project_root, "logs")
     os.makedirs(logs_dir, exist_ok=True)
+    return logs_dir
+
+def get_logger(name="default"):
+    logs_dir = get_logs_dir()
 
     # Force all logs to this file
     log_file_path = os.path.join(logs_dir, "finalization_api.log")
@@ -69,36 +76,44 @@ def safe_standardize_date(date_str):
         utils_logger.error(f"Error safe_standardize_date {date_str} : {str(e)}")
         return date_str
 		
-def standardize_date(date_str, context=""):
+# Formats accepted by standardize_date / to_datetime
+STANDARDIZE_DATE_FORMATS = [
+    "%m/%d/%y", "%m-%d-%y", "%m/%d/%Y", "%m-%d-%Y",
+    "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y",
+    "%m-%d %Y", "%m-%d %y",  # handles '04-15 24'
+    "%m %d %Y", "%B %Y", "%b %Y", "%B %d, %Y" # 'August 2022'
+]
+
+def to_datetime(date_str):
     """
-    Converts various date formats to a standardized MM/DD/YY format.
-    Supported input formats: MM/DD/YY, MM-DD-YY, etc.
+    Parses a date string with the same formats as standardize_date.
+    Returns a datetime, or None if the string is empty or not recognized.
     """
-    if not date_str or date_str.lower() == "n/a":
-        return ""
+    if not date_str or date_str.strip().lower() == "n/a":
+        return None
 
     date_str = date_str.strip()
     date_str = re.sub(r'\b(\d{1,2})(st|nd|rd|th)\b', r'\1', date_str, flags=re.IGNORECASE)
 
-
-
-    # Try known formats
-
-    for fmt in [
-                "%m/%d/%y", "%m-%d-%y", "%m/%d/%Y", "%m-%d-%Y",
-                "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y",
-                "%m-%d %Y", "%m-%d %y",  # handles '04-15 24'
-                "%m %d %Y", "%B %Y", "%b %Y", "%B %d, %Y" # 'August 2022'
-                
-                ]:
-        
+    for fmt in STANDARDIZE_DATE_FORMATS:
         try:
-            dt = datetime.strptime(date_str, fmt)
-            return dt.strftime("%#m/%#d/%y")  # Windows-friendly
-
-        except ValueError as e:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
             continue
-    utils_logger.warning(f"Unrecognized date '{date_str}' {f'| Context: {context}' if context else ''}") 
+    return None
+
+def standardize_date(date_str, context=""):
+    """
+    Converts various date formats to a standardized MM/DD/YY format.
+    Supported input formats: MM/DD/YY, MM-DD-YY, etc.
+    """
+    if not date_str or date_str.lower() == "n/a":
+        return ""
+
+    dt = to_datetime(date_str)
+    if dt:
+        return dt.strftime("%#m/%#d/%y")  # Windows-friendly
+    utils_logger.warning(f"Unrecognized date '{date_str.strip()}' {f'| Context: {context}' if context else ''}") 
     return ""  # Return empty if format not matched
     
 def parse_date_old(date_str):
@@ -395,190 +410,186 @@ def log_error(filepath, error_message):
     }
 
 
-def group_and_label_basic(documents, dedup_key_func):
+VALID_SIGNATURES = {"yes", "signed", "true"}
+
+def is_signed(value):
+    return bool(value) and value.strip().lower() in VALID_SIGNATURES
+
+def filename_priority(doc):
+    """Default priority: first document by filename wins."""
+    return doc.get("filename", "")
+
+def signature_priority(signature_extractor):
+    """Signed documents first, then filename order."""
+    def priority(doc):
+        return (0 if is_signed(signature_extractor(doc)) else 1, doc.get("filename", ""))
+    return priority
+
+def signature_date_priority(signature_extractor, signature_date_extractor):
+    """
+    1. Signed with a parseable signature date -> latest date first
+    2. Signed but no (valid) date -> filename order
+    3. No signature -> filename order
     """
-    Groups documents by a deduplication key and labels first doc in each group as 'original',
-    rest as 'duplicate'. No signature field considered.
+    def priority(doc):
+        filename = doc.get("filename", "")
+        if not is_signed(signature_extractor(doc)):
+            return (2, 0, filename)
+        signed_on = to_datetime(signature_date_extractor(doc))
+        if signed_on is None:
+            return (1, 0, filename)
+        return (0, -signed_on.toordinal(), filename)
+    return priority
+
+def w2c_priority(doc):
+    """W2-C folders beat W2 folders; within a folder type, input order wins."""
+    folder = doc.get("folder_name", "").lower()
+    if "w2_c" in folder:
+        return 0
+    if "w2" in folder:
+        return 1
+    return 2
+
+_SKIPPED = object()
+_KEY_ERROR = object()
+
+def iter_group_and_label(documents, dedup_key_func, priority_func=filename_priority):
     """
-    from collections import defaultdict
+    Streaming deduplication engine behind the group_and_label_* helpers.
 
-    grouped = defaultdict(list)
-    labeled = []
+    Each document's key and priority are computed exactly once. Within a key, the
+    document with the lowest priority is labeled 'original' and the rest 'duplicate';
+    equal priorities keep input order. Only the key per document and the current
+    winner per key are held, so the cost is linear in the number of documents.
+    Labeled documents are yielded in input order; documents without "data" are skipped.
 
-    for doc in documents:
+    :param documents: Sequence of document dicts (iterated twice)
+    :param dedup_key_func: doc -> hashable grouping key
+    :param priority_func: doc -> comparable rank, lower is preferred
+    """
+    if not isinstance(documents, (list, tuple)):
+        documents = list(documents)
+
+    keys = []
+    winners = {}       # key -> (priority, position)
+    group_errors = {}  # key -> error message
+
+    for position, doc in enumerate(documents):
         if "data" not in doc:
+            keys.append(_SKIPPED)
             continue
+        filename = doc.get("filename", "unknown")
         try:
             key = dedup_key_func(doc)
-            filename = doc.get("filename", "unknown")
-            utils_logger.info(f"[DEDUPE] {filename} → key: {key}")
-            grouped[key].append(doc)
         except Exception as e:
+            keys.append(_KEY_ERROR)
             doc["status"] = "error"
             doc["error_message"] = f"Key extraction error: {str(e)}"
-            labeled.append(doc)
             utils_logger.error(f"[ERROR] dedup key extraction for {filename}: {str(e)}")
-            
+            continue
 
-    for group_docs in grouped.values():
+        keys.append(key)
+        utils_logger.debug(f"[DEDUPE] {filename} -> key: {key}")
+        if key in group_errors:
+            continue
         try:
-            group_docs.sort(key=lambda d: d["filename"])
-            group_docs[0]["status"] = "original"
-            for d in group_docs[1:]:
-                d["status"] = "duplicate"
-            labeled.extend(group_docs)
+            priority = priority_func(doc)
+            current = winners.get(key)
+            if current is None or priority < current[0]:
+                winners[key] = (priority, position)
         except Exception as e:
-            for d in group_docs:
-                d["status"] = "error"
-                d["error_message"] = f"Deduplication error: {str(e)}"
-            labeled.extend(group_docs)
+            group_errors[key] = f"Deduplication error: {str(e)}"
+            winners.pop(key, None)
             utils_logger.error(f"Error Deduplication error: {str(e)}")
 
-    return labeled
+    counts = {"original": 0, "duplicate": 0, "error": 0}
+    for position, (doc, key) in enumerate(zip(documents, keys)):
+        if key is _SKIPPED:
+            continue
+        if key is not _KEY_ERROR:
+            if key in group_errors:
+                doc["status"] = "error"
+                doc["error_message"] = group_errors[key]
+            else:
+                doc["status"] = "original" if winners[key][1] == position else "duplicate"
+        counts[doc["status"]] += 1
+        yield doc
+
+    utils_logger.info(
+        f"[DEDUPE] {sum(counts.values())} documents, {len(winners) + len(group_errors)} groups: "
+        f"{counts['original']} original, {counts['duplicate']} duplicate, {counts['error']} error"
+    )
+
+def document_values_text(doc):
+    """Comparable text of a document's label values (transform_input_json output)"""
+    return label_values_text(transform_input_json(doc["data"]))
 
-def group_and_label_with_signature(documents, dedup_key_func, signature_extractor):
+def flag_near_duplicates(documents, text_func=document_values_text, threshold=90):
     """
-    Groups documents by a deduplication key, considers 'Signature' field.
-    If one signed doc, it's 'original'. If multiple, pick first. If none, default to filename order.
+    Optional stage after group-and-label: flags OCR-variant copies the exact dedup key missed.
+    Every document in a near-duplicate cluster gets "near_duplicate_cluster" (int);
+    all but the cluster lead (its first 'original') also get "near_duplicate_of" (lead filename).
+    Statuses are left untouched.
     """
-    from collections import defaultdict
-
-    grouped = defaultdict(list)
-    labeled = []
-
-    for doc in documents:
-        if "data" not in doc:
-            continue
+    docs = [d for d in documents if "data" in d]
+    texts = []
+    for doc in docs:
         try:
-            key = dedup_key_func(doc)
-            filename = doc.get("filename", "unknown")
-            utils_logger.info(f"[DEDUPE] {filename} → key: {key}")
-            grouped[key].append(doc)
+            texts.append(text_func(doc))
         except Exception as e:
-            doc["status"] = "error"
-            doc["error_message"] = f"Key extraction error: {str(e)}"
-            labeled.append(doc)
-            utils_logger.error(f"[ERROR] dedup key extraction for {filename}: {str(e)}")
-
-    for group_docs in grouped.values():
-        try:
-            valid_signatures = {"yes", "signed", "true"}
-            
-            signed_docs = [d for d in group_docs if signature_extractor(d).strip().lower() in valid_signatures]
-
-            if signed_docs:
-                # Case 1: Signed document(s) exist
-                signed_docs.sort(key=lambda d: d["filename"])
-                signed_original = signed_docs[0]
-                signed_original["status"] = "original"
+            texts.append("")
+            utils_logger.error(f"[NEAR-DUP] text extraction for {doc.get('filename', 'unknown')}: {str(e)}")
+
+    clusters = find_near_duplicate_clusters(texts, threshold=threshold)
+    for cluster_id, members in enumerate(clusters, start=1):
+        lead = next((docs[i] for i in members if docs[i].get("status") == "original"), docs[members[0]])
+        for i in members:
+            docs[i]["near_duplicate_cluster"] = cluster_id
+            if docs[i] is not lead:
+                docs[i]["near_duplicate_of"] = lead.get("filename", "")
+
+    if clusters:
+        utils_logger.info(
+            f"[NEAR-DUP] {len(clusters)} clusters covering {sum(len(c) for c in clusters)} of {len(docs)} documents"
+        )
+    return documents
 
-                for d in group_docs:
-                    if d != signed_original:
-                        d["status"] = "duplicate"
-            else:
-                # Case 2: No signed documents
-                group_docs.sort(key=lambda d: d["filename"])
-                group_docs[0]["status"] = "original"
-                for d in group_docs[1:]:
-                    d["status"] = "duplicate"
+def _finish_labeling(labeled, near_duplicates):
+    labeled = list(labeled)
+    return flag_near_duplicates(labeled) if near_duplicates else labeled
 
-            labeled.extend(group_docs)
-        except Exception as e:
-            for d in group_docs:
-                d["status"] = "error"
-                d["error_message"] = f"Deduplication error: {str(e)}"
-            labeled.extend(group_docs)
-            utils_logger.error(f"Error Deduplication error: {str(e)}")
+def group_and_label_basic(documents, dedup_key_func, near_duplicates=False):
+    """
+    Groups documents by a deduplication key and labels first doc (by filename) in each
+    group as 'original', rest as 'duplicate'. No signature field considered.
+    """
+    return _finish_labeling(iter_group_and_label(documents, dedup_key_func), near_duplicates)
 
-    return labeled
+def group_and_label_with_signature(documents, dedup_key_func, signature_extractor, near_duplicates=False):
+    """
+    Groups documents by a deduplication key, considers 'Signature' field.
+    If one signed doc, it's 'original'. If multiple, pick first. If none, default to filename order.
+    """
+    return _finish_labeling(
+        iter_group_and_label(documents, dedup_key_func, signature_priority(signature_extractor)),
+        near_duplicates,
+    )
     
-def group_and_label_with_signature_date(documents, dedup_key_func, signature_extractor, signature_date_extractor):
+def group_and_label_with_signature_date(documents, dedup_key_func, signature_extractor, signature_date_extractor,
+                                        near_duplicates=False):
     """
     Priority-based deduplication:
     1. Signed with signature date → latest date wins
     2. Signed but no date → first by filename wins
     3. No signature → fallback to first by filename
     """
-    from collections import defaultdict
-
-    grouped = defaultdict(list)
-    labeled = []
-
-    valid_signatures = {"yes", "signed", "true"}
-
-    def is_signed(val):
-        return val.strip().lower() in valid_signatures
-
-    for doc in documents:
-        if "data" not in doc:
-            continue
-        try:
-            key = dedup_key_func(doc)
-            filename = doc.get("filename", "unknown")
-            utils_logger.info(f"[DEDUPE] {filename} → key: {key}")
-            grouped[key].append(doc)
-        except Exception as e:
-            doc["status"] = "error"
-            doc["error_message"] = f"Key extraction error: {str(e)}"
-            labeled.append(doc)
-            utils_logger.error(f"[ERROR] dedup key extraction for {filename}: {str(e)}")
-
-    for group_docs in grouped.values():
-        try:
-            bucket1 = []  # signed + date
-            bucket2 = []  # signed only
-            bucket3 = []  # no signature (or only date)
-
-            for d in group_docs:
-                sig = signature_extractor(d).strip().lower()
-                sig_date_str = signature_date_extractor(d)
-                
-                is_sig = is_signed(sig)
-
-                if is_sig and sig_date_str:
-                    try:
-                        parsed_date = standardize_date(sig_date_str)
-                        bucket1.append((d, parsed_date))
-                    except Exception as e:
-                        utils_logger.warning(f"Invalid signature date in doc {d['filename']}: {sig_date_str}")
-                        bucket2.append(d)  # Treat as signature only if date is unparseable
-                elif is_sig:
-                    bucket2.append(d)
-                else:
-                    bucket3.append(d)
-
-            if bucket1:
-                # Priority 1: signed + valid date
-                bucket1.sort(key=lambda x: x[1], reverse=True)
-                bucket1[0][0]["status"] = "original"
-                rest = [doc for doc, _ in bucket1[1:]] + bucket2 + bucket3
-                for d in rest:
-                    d["status"] = "duplicate"
-
-            elif bucket2:
-                # Priority 2: signature only
-                bucket2.sort(key=lambda d: d["filename"])
-                bucket2[0]["status"] = "original"
-                for d in bucket2[1:] + bucket3:
-                    d["status"] = "duplicate"
-
-            else:
-                # Priority 3: no signature at all
-                group_docs.sort(key=lambda d: d["filename"])
-                group_docs[0]["status"] = "original"
-                for d in group_docs[1:]:
-                    d["status"] = "duplicate"
-
-            labeled.extend(group_docs)
-
-        except Exception as e:
-            for d in group_docs:
-                d["status"] = "error"
-                d["error_message"] = f"Deduplication error: {str(e)}"
-            labeled.extend(group_docs)
-            utils_logger.error(f"Deduplication error: {str(e)}")
-
-    return labeled
+    return _finish_labeling(
+        iter_group_and_label(
+            documents, dedup_key_func,
+            signature_date_priority(signature_extractor, signature_date_extractor),
+        ),
+        near_duplicates,
+    )
     
 def label_all_original(documents):
     """
@@ -589,49 +600,12 @@ def label_all_original(documents):
         doc["status"] = "original"
     return documents
     
-def group_and_label_with_w2c(documents, dedup_key_func):
-    from collections import defaultdict
-
-    grouped = defaultdict(list)
-    labeled = []
-
-    # Group by deduplication key
-    for doc in documents:
-        if "data" not in doc:
-            continue
-        try:
-            key = dedup_key_func(doc)
-            filename = doc.get("filename", "unknown")
-            grouped[key].append(doc)
-            utils_logger.info(f"[DEDUPE] {filename} -> key: {key}")
-        except Exception as e:
-            doc["status"] = "error"
-            doc["error_message"] = f"Key extraction error: {str(e)}"
-            labeled.append(doc)
-            utils_logger.error(f"Error in dedup_key for doc {doc.get('filename', '')}: {str(e)}")
-
-    for key, group_docs in grouped.items():
-        # Separate w2-c and w2 docs based on folder (or any other marker)
-        w2c_docs = [d for d in group_docs if "w2_c" in d.get("folder_name", "").lower()]
-        w2_docs = [d for d in group_docs if "w2" in d.get("folder_name", "").lower() and "w2_c" not in d.get("folder_name", "").lower()]
-
-        if w2c_docs:
-            # Mark one W2-C as original, rest duplicates
-            w2c_docs[0]["status"] = "original"
-            for d in w2c_docs[1:]:
-                d["status"] = "duplicate"
-            # All W2 in same group become duplicate
-            for d in w2_docs:
-                d["status"] = "duplicate"
-            labeled.extend(w2c_docs + w2_docs)
-        else:
-            # Only W2s present - one original, rest duplicate
-            w2_docs[0]["status"] = "original"
-            for d in w2_docs[1:]:
-                d["status"] = "duplicate"
-            labeled.extend(w2_docs)
-
-    return labeled
+def group_and_label_with_w2c(documents, dedup_key_func, near_duplicates=False):
+    """
+    Within each group a W2-C is the 'original' and every W2 a 'duplicate';
+    without a W2-C the first W2 is the 'original'.
+    """
+    return _finish_labeling(iter_group_and_label(documents, dedup_key_func, w2c_priority), near_duplicates)
     
 def normalize_name(name):
     """
@@ -702,16 +676,21 @@ def identify_matching_borrower(doc_borrowers, final_context):
     return None
    
 
+# Property address fields, collected in one traversal (see extraction_plan.py)
+PROPERTY_ADDRESS_PLAN = ExtractionPlan("PropertyAddress", [
+    FieldSpec("address", "Property Address", post=("flatten",)),
+    FieldSpec("city", "Property City", post=("flatten",)),
+    FieldSpec("state", "Property State", groups=False, post=("flatten",)),
+    FieldSpec("zipcode", "Property Zip Code", post=("flatten",)),
+])
+
 def extract_property_address(content, context="", note_skill_name = "Note Extraction"):
+    record = PROPERTY_ADDRESS_PLAN.extract(content, skill=note_skill_name, context=context)
     if note_skill_name == "Note Extraction" or note_skill_name == "1003":
-        address =  flatten_to_string(get_first_label_value_any_depth(content, "Property Address", note_skill_name, context=context))
-        city =  flatten_to_string(get_first_label_value_any_depth(content, "Property City", note_skill_name, context=context))
-        state =  flatten_to_string(get_label_value_any_depth(content, "Property State", note_skill_name, context=context))
-        print("note state:",state)
-        zipcode =  flatten_to_string(get_first_label_value_any_depth(content, "Property Zip Code", note_skill_name, context=context))
-        property_address = address + " " + city + " , " + state + " " + zipcode
+        print("note state:", record.state)
+        property_address = record.address + " " + record.city + " , " + record.state + " " + record.zipcode
     else:
-        property_address =  flatten_to_string(get_first_label_value_any_depth(content, "Property Address", note_skill_name, context))
+        property_address = record.address
     
     return property_address
     
@@ -721,9 +700,14 @@ def safe_compare(a, b):
     return compare_strings_similarity(a, b)["match_decision"]
     
 def extract_street_only(address):
+    # Parsed tags come from the canonical address store, primed at ingest time
+    if not isinstance(address, str) or not address.strip():
+        return address
     try:
-        components, addr_type = usaddress.tag(address)
-        parsed = components
+        record = address_store.get(address)
+        parsed, addr_type = record["tags"], record["address_type"]
+        if parsed is None:
+            return address
         if addr_type == "Street Address":
             
             print("\n US Address:", parsed, "\n")
@@ -0,0 +1,183 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.core.executors import run_blocking
+from .compare_strings import MATCH_PROFILES, safe_string_compare
+
+
+class PoolOverloaded(Exception):
+    """Raised by ValidationPool.compare when the queue is full; retry_after is in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Validation queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    from .warmup import warm_up
+    warm_up()
+
+
+def compare_batch(pairs):
+    """safe_string_compare results for (a, b, field_type, profile) tuples; runs in a worker process"""
+    return [
+        safe_string_compare(a, b, field_type=field_type, profile=profile)
+        for a, b, field_type, profile in pairs
+    ]
+
+
+class ValidationPool:
+    """
+    Runs safe_string_compare in worker processes so CPU-heavy comparisons (usaddress
+    parses, fuzzy metrics) never block the event loop.
+
+    Requests are queued and a dispatcher sends them to the workers in batches
+    (up to batch_size, waiting at most batch_wait seconds to fill one), with at most
+    one batch per worker in flight. At most max_queue comparisons may wait; beyond
+    that compare() raises PoolOverloaded instead of queueing without bound.
+
+    Profiles are resolved in the API process and sent with every pair, so workers
+    always use the current (possibly just updated) thresholds. With workers=0 the
+    comparisons run on the IO thread pool instead.
+    """
+
+    def __init__(self, workers=None, max_queue=None, batch_size=None, batch_wait=None, retry_after=None):
+        self.workers = workers if workers is not None else int(
+            os.getenv("VALIDATION_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))
+        )
+        self.max_queue = max_queue or int(os.getenv("VALIDATION_MAX_QUEUE", "256"))
+        self.batch_size = batch_size or int(os.getenv("VALIDATION_BATCH_SIZE", "32"))
+        if batch_wait is None:
+            batch_wait = float(os.getenv("VALIDATION_BATCH_WAIT_MS", "2")) / 1000
+        self.batch_wait = batch_wait
+        self.retry_after = retry_after or int(os.getenv("VALIDATION_RETRY_AFTER", "1"))
+        self._executor = None
+        self._queue = None
+        self._slots = None
+        self._dispatcher = None
+        self._batches = set()
+        self.stats_counters = {"submitted": 0, "rejected": 0, "batches": 0, "batched_pairs": 0}
+
+    def _new_executor(self):
+        # spawn: workers must not inherit the parent's Mongo client, event loop or threads
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    def start(self):
+        if self._dispatcher is not None or self.workers <= 0:
+            return
+        self._executor = self._new_executor()
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        batches = list(self._batches)
+        for task in batches:
+            task.cancel()
+        # Cancelled batches fail their callers' futures on the way out
+        await asyncio.gather(*batches, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def compare(self, a, b, field_type="default"):
+        """safe_string_compare(a, b, field_type) off the event loop"""
+        profile = dict(MATCH_PROFILES[field_type])
+        if self._dispatcher is None:
+            return await run_blocking(safe_string_compare, a, b, field_type=field_type, profile=profile)
+
+        if self._queue.qsize() >= self.max_queue:
+            self.stats_counters["rejected"] += 1
+            raise PoolOverloaded(self.retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(((a, b, field_type, profile), future))
+        self.stats_counters["submitted"] += 1
+        return await future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+
+            # Callers that gave up (client disconnected) don't need a result
+            batch = [(pair, future) for pair, future in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch):
+        started = time.perf_counter()
+        executor = self._executor
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                executor, compare_batch, [pair for pair, _ in batch]
+            )
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._executor is executor:
+                # A worker died (e.g. OOM-killed): replace the pool for later batches,
+                # unless a concurrent batch that failed with it already did
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            # Cancelled (stop()) or otherwise unresolved: don't leave callers waiting
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            self._slots.release()
+            self.stats_counters["batches"] += 1
+            self.stats_counters["batched_pairs"] += len(batch)
+            self.stats_counters["last_batch_seconds"] = round(time.perf_counter() - started, 4)
+
+    def stats(self):
+        counters = dict(self.stats_counters)
+        batches = counters["batches"]
+        return {
+            "workers": self.workers if self._dispatcher is not None else 0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_batches": len(self._batches),
+            "max_queue": self.max_queue,
+            "avg_batch_size": round(counters["batched_pairs"] / batches, 2) if batches else 0.0,
+            **counters,
+        }
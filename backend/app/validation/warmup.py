@@ -0,0 +1,33 @@
+import time
+
+# Representative inputs: one tag call loads the usaddress CRF model, the comparisons
+# touch every rapidfuzz scorer used by safe_string_compare
+_SAMPLE_ADDRESSES = (
+    "1566 east 5th street, ontario, california, 91764",
+    "1566 E 5th ST, ontario, CA, 91764",
+)
+_SAMPLE_NAMES = ("Rosa M Lemus Zepeda", "Rosa Lemus Zepeda")
+
+
+def warm_up():
+    """
+    Imports and exercises the heavy validation dependencies once, so the first real
+    request doesn't pay for loading them. Blocking; run it in a worker thread.
+
+    :return: {step: seconds} timings
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    import usaddress
+    usaddress.tag(_SAMPLE_ADDRESSES[0])
+    timings["usaddress"] = round(time.perf_counter() - start, 4)
+
+    start = time.perf_counter()
+    from .compare_strings import safe_string_compare
+    safe_string_compare(*_SAMPLE_NAMES, field_type="name")
+    safe_string_compare(*_SAMPLE_ADDRESSES, field_type="address")
+    # The address comparison also opens the canonical address store (when enabled)
+    timings["string_compare"] = round(time.perf_counter() - start, 4)
+
+    return timings
@@ -1,25 +1,130 @@
 from app.routes import auth_router
 from app.db.database import db
+from app.core.responses import ORJSONResponse
+from app.core.compression import CompressionMiddleware
+from app.core.profiling import ProfilingMiddleware, profile_index, get_profiles_dir
+from app.core.executors import run_blocking, run_cancellable, shutdown_io_executor, io_executor_stats
+from app.core.jobs import get_job
+from app.core.loop_monitor import loop_monitor
+from app.core.upload_limits import UploadLimitMiddleware
+from app.db.revisions import bump_revision, get_revision
+from app.db.filter_keys import merge_filter_keys
+from app.db.name_index import (
+    borrower_names, ensure_name_indexes, find_candidates, verify_candidates,
+    replace_document_names, remove_document_names,
+)
+from app.db.search_index import (
+    SEARCH_MODES, SEARCH_SOURCES, ensure_search_indexes, label_value_entries,
+    replace_document_entries, remove_document_entries, search_label_values,
+    SEARCH_INDEX_JOB, start_search_index_rebuild, resume_search_index_rebuild,
+)
+from app.db.payload_codec import (
+    storage_codec, encode_payloads, decode_payload, decode_payloads, output_categories,
+    PAYLOAD_COMPRESSION_JOB, start_payload_migration, resume_payload_migration,
+)
+from app.utils.etag import make_etag, etag_matches, etag_headers, not_modified
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, UploadFile, Form, HTTPException, File
+from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import FastAPI, UploadFile, Form, HTTPException, File, Header, Request
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from datetime import datetime
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from pathlib import Path
-from app.validation.compare_strings import safe_string_compare
+from app.validation.compare_normalize_address import match_address_against_many
+from app.validation.field_matching import compute_match_results
+from app.validation.compare_strings import MATCH_PROFILES
+from app.validation.validation_pool import ValidationPool, PoolOverloaded
+from app.validation.compare_cache import CompareCacheMiddleware, cache_stats as compare_cache_stats
+from app.validation.match_profiles import load_match_profiles, refresh_match_profiles, update_match_profile
+from app.validation.revalidation import REVALIDATION_JOB, start_revalidation_job, resume_revalidation_job
+from app.validation.warmup import warm_up
+from app.schemas.validation_schema import AddressMatchRequest, MatchProfileUpdate
+from app.utils.columnar import category_rows, compact_finalisation, expand_document
+from app.utils.export import (
+    EXPORT_SOURCES, build_export_query, build_export_projection,
+    iter_export_rows, stream_ndjson, stream_csv,
+)
+from app.ingest.transform import transform_input_json
+from app.ingest.archive import read_zip_inputs, ArchiveRejected
+from app.ingest.pipeline import BatchIngest, make_processed_dirs, output_json_name_for
+from app.ingest.addresses import parse_and_prime, shutdown_parse_pool
+from app.ingest.uploads import check_upload_sizes, read_upload_json, load_input_upload, max_request_bytes
+import asyncio
 import json
 import os
 import traceback
-import tempfile
-import zipfile
 import glob
 
 
 # Load .env
 load_dotenv()
 
-app = FastAPI(title="Finalization API")
+# DB setup (Motor connects lazily, on the first operation)
+database_url = os.getenv("MONGODB_URL")
+db_name = os.getenv("DB_Name")
+
+print(f"Using database: {db_name}")
+
+client = AsyncIOMotorClient(database_url)
+db = client[db_name]
+upload_json_collection = db["uploadedJSON"]
+filtered_key_collection = db["filteredKey"]
+revision_collection = db["revisions"]
+match_profile_collection = db["matchProfiles"]
+job_collection = db["jobs"]
+search_index_collection = db["labelIndex"]
+borrower_name_collection = db["borrowerNames"]
+
+HEALTH_PING_TIMEOUT = float(os.getenv("HEALTH_PING_TIMEOUT", "2"))
+
+
+async def warm_up_app(app):
+    """Loads persisted match profiles and preloads validation dependencies, then marks the app ready"""
+    try:
+        await load_match_profiles(match_profile_collection)
+    except Exception as e:
+        print(f"⚠️ Using built-in match profiles: {e}")
+
+    try:
+        await ensure_search_indexes(search_index_collection)
+        await ensure_name_indexes(borrower_name_collection)
+    except Exception as e:
+        print(f"⚠️ Could not ensure search indexes: {e}")
+
+    try:
+        app.state.warmup = await asyncio.to_thread(warm_up)
+        print(f"🔥 Warm-up done: {app.state.warmup}")
+    except Exception as e:
+        print(f"⚠️ Warm-up failed, validation will load lazily: {e}")
+
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm-up runs in the background so /health/live answers immediately;
+    # /health/ready stays 503 until it has finished
+    app.state.ready = False
+    app.state.warmup = {}
+    loop_monitor.start()
+    # CPU-bound comparisons for /validate_property (VALIDATION_WORKERS processes)
+    app.state.validation_pool = ValidationPool()
+    app.state.validation_pool.start()
+    warmup_task = asyncio.create_task(warm_up_app(app))
+    # Profiles updated through another API worker reach this one within PROFILE_REFRESH_SECONDS
+    profile_refresh_task = asyncio.create_task(refresh_match_profiles(match_profile_collection))
+    yield
+    warmup_task.cancel()
+    profile_refresh_task.cancel()
+    await app.state.validation_pool.stop()
+    await loop_monitor.stop()
+    shutdown_io_executor()
+    shutdown_parse_pool()
+    client.close()
+
+
+app = FastAPI(title="Finalization API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,91 +134,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# DB setup
-database_url = os.getenv("MONGODB_URL")
-db_name = os.getenv("DB_Name")
+# gzip/brotli for large document payloads
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+)
 
-print(f"Connecting to database: {database_url} | DB Name: {db_name}")
+# Request body ceiling (UPLOAD_MAX_REQUEST_BYTES) and peak RSS reporting for ingest routes
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_request_bytes=max_request_bytes(),
+    memory_paths=("/upload_json", "/batch_process"),
+)
 
-client = AsyncIOMotorClient(database_url)
-db = client[db_name]
-upload_json_collection = db["uploadedJSON"]
-filtered_key_collection = db["filteredKey"]
+# Opt-in request profiling (X-Profile: <PROFILE_ADMIN_TOKEN> header or PROFILE_ROUTES)
+app.add_middleware(ProfilingMiddleware)
 
-# ✅ Helper function to transform input JSON structure
-# ✅ UPDATED: Helper function to transform input JSON structure
-# ✅ UPDATED: Helper function to transform input JSON structure
-def transform_input_json(raw_data):
-    """
-    Transform input JSON - Only Labels array data
-    - Single value: "LabelName": "Value"
-    - Multiple values: "LabelName": ["Value1", "Value2"]
-    """
+# Per-request scope of the safe_string_compare cache
+app.add_middleware(CompareCacheMiddleware)
+
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and its event loop is serving requests"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready(request: Request):
+    """Readiness: warm-up has finished and MongoDB answers a ping"""
+    if not request.app.state.ready:
+        return ORJSONResponse({"status": "warming_up"}, status_code=503)
     try:
-        transformed = {}
-        
-        # Process Summary -> Labels ONLY
-        if "Summary" in raw_data and isinstance(raw_data["Summary"], list):
-            for summary_item in raw_data["Summary"]:
-                if "Labels" in summary_item and isinstance(summary_item["Labels"], list):
-                    for label in summary_item["Labels"]:
-                        # Keep original LabelName
-                        label_name = label.get("LabelName", "Unknown")
-                        
-                        # Get Values array
-                        values_array = label.get("Values", [])
-                        
-                        # Extract "Value" field from each object
-                        extracted_values = [
-                            v.get("Value", "") for v in values_array 
-                            if isinstance(v, dict)
-                        ]
-                        
-                        # Filter out empty values
-                        extracted_values = [v for v in extracted_values if v]
-                        
-                        # Store based on count
-                        if len(extracted_values) == 0:
-                            transformed[label_name] = ""
-                        elif len(extracted_values) == 1:
-                            transformed[label_name] = extracted_values[0]  # Single value as string
-                        else:
-                            transformed[label_name] = extracted_values  # Multiple values as array
-        
-        return transformed
+        await asyncio.wait_for(client.admin.command("ping"), timeout=HEALTH_PING_TIMEOUT)
     except Exception as e:
-        print(f"Error transforming JSON: {e}")
-        traceback.print_exc()
-        return {}
+        return ORJSONResponse({"status": "unavailable", "error": str(e)}, status_code=503)
+    return {"status": "ready", "warmup": request.app.state.warmup}
+
+
+@app.get("/metrics/event_loop")
+async def event_loop_metrics(request: Request):
+    """Event-loop lag (should stay flat while ingest runs), IO pool and validation pool occupancy"""
+    return {
+        "lag": loop_monitor.stats(),
+        "io_pool": io_executor_stats(),
+        "validation_pool": request.app.state.validation_pool.stats(),
+    }
+
+
+@app.get("/metrics/compare_cache")
+async def compare_cache_metrics():
+    """safe_string_compare cache hit rates (process-wide LRU and per-request scopes)"""
+    return compare_cache_stats()
+
+
+# ✅ Helper functions to update filter keys
+async def add_filter_keys(keys):
+    """Merge keys into the filteredKey collection in a single upsert round-trip"""
+    await merge_filter_keys(filtered_key_collection, keys)
 
 
-# ✅ Helper function to update filter keys
 async def update_filter_keys(raw_json):
     """Extract keys from raw_json.finalisation and update filteredKey collection"""
-    try:
-        if not raw_json or "finalisation" not in raw_json:
-            return
-        
-        filter_doc = await filtered_key_collection.find_one({"_id": "filter_keys"})
-        new_keys = list(raw_json["finalisation"].keys())
-        
-        if filter_doc:
-            existing_keys = filter_doc.get("keys", [])
-            merged_keys = list(set(existing_keys + new_keys))
-            await filtered_key_collection.update_one(
-                {"_id": "filter_keys"},
-                {"$set": {"keys": merged_keys}}
-            )
-            print(f"✅ Updated filter keys: {merged_keys}")
-        else:
-            await filtered_key_collection.insert_one({
-                "_id": "filter_keys",
-                "keys": new_keys
-            })
-            print(f"✅ Created filter keys: {new_keys}")
-            
-    except Exception as e:
-        print(f"Error updating filter keys: {e}")
+    if not raw_json or "finalisation" not in raw_json:
+        return
+    await add_filter_keys(raw_json["finalisation"].keys())
 
 
 @app.delete("/delete_all_json")
@@ -124,6 +209,9 @@ async def delete_all_json():
     """
     try:
         result = await upload_json_collection.delete_many({})
+        await remove_document_entries(search_index_collection)
+        await remove_document_names(borrower_name_collection)
+        await bump_revision(revision_collection, "uploadedJSON")
         return {
             "message": f"Deleted {result.deleted_count} documents from uploadedJSON collection",
             "deleted_count": result.deleted_count,
@@ -142,32 +230,29 @@ async def upload_json(
     finalization_document_name: str = Form(...),
     json_file: UploadFile = File(None),
     input_files: List[UploadFile] = File(None),
-    output_file: UploadFile = File(None)
+    output_file: UploadFile = File(None),
+    store_original_bm_json: bool = Form(True),
 ):
     """
     Handles uploads of:
     1. Single JSON file (legacy)
     2. Folder structure (multiple JSON files)
     3. Single ZIP file (containing categorized JSONs)
+
+    With store_original_bm_json=false, ZIP members are streamed and only the
+    transformed label values are kept (original_bm_json is left empty).
+
+    Files are read from their spooled temp files, never fully buffered by the handler.
+    Oversized files (UPLOAD_MAX_FILE_BYTES) and archives over the ZIP limits get a 413.
     """
     try:
-        encodings = ['utf-8', 'utf-8-sig', 'windows-1252', 'latin-1', 'iso-8859-1']
+        check_upload_sizes(json_file, output_file, *(input_files or []))
 
         # ===== CASE 1: Single JSON File Upload =====
         if json_file and not input_files and not output_file:
             print(f"📄 Single file upload: {json_file.filename}")
 
-            file_content = await json_file.read()
-            raw_json = None
-
-            for encoding in encodings:
-                try:
-                    decoded_content = file_content.decode(encoding)
-                    raw_json = json.loads(decoded_content)
-                    print(f"✅ Successfully decoded with: {encoding}")
-                    break
-                except (UnicodeDecodeError, json.JSONDecodeError):
-                    continue
+            raw_json = await run_blocking(read_upload_json, json_file.file)
 
             if raw_json is None:
                 raise HTTPException(status_code=400, detail="Could not decode JSON file")
@@ -182,9 +267,20 @@ async def upload_json(
                 "raw_json": raw_json,
                 "upload_date": datetime.utcnow(),
                 "upload_type": "single_file",
+                "output_categories": output_categories(raw_json),
+                "revision": 1,
             }
 
+            search_entries = await run_blocking(
+                label_value_entries, None, raw_json.get("finalisation") if isinstance(raw_json, dict) else None
+            )
+            await run_blocking(encode_payloads, document)
             result = await upload_json_collection.insert_one(document)
+            await replace_document_entries(
+                search_index_collection, result.inserted_id, username, finalization_document_name, search_entries
+            )
+            await replace_document_names(borrower_name_collection, result.inserted_id, borrower_names(search_entries))
+            await bump_revision(revision_collection, "uploadedJSON")
             print(f"✅ Single file inserted with ID: {result.inserted_id}")
 
             return {
@@ -221,51 +317,13 @@ async def upload_json(
                 uploaded_zip = input_files[0]
                 print(f"📦 ZIP upload detected: {uploaded_zip.filename}")
 
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    temp_path = Path(temp_dir)
-                    zip_path = temp_path / uploaded_zip.filename
-
-                    # Save uploaded zip
-                    with open(zip_path, "wb") as f:
-                        f.write(await uploaded_zip.read())
-
-                    # Extract zip
-                    with zipfile.ZipFile(zip_path, "r") as zip_ref:
-                        zip_ref.extractall(temp_dir)
-
-                    print(f"✅ Extracted ZIP contents to: {temp_dir}")
-
-                    # Walk through all JSON files inside
-                    for root, _, files in os.walk(temp_dir):
-                        for file in files:
-                            if not file.endswith(".json"):
-                                continue
-
-                            file_path = Path(root) / file
-                            relative_path = file_path.relative_to(temp_path)
-                            parts = str(relative_path).split(os.sep)
-                            category = parts[0] if len(parts) > 1 else "Uncategorized"
-
-                            try:
-                                with open(file_path, "r", encoding="utf-8") as f:
-                                    content = f.read()
-                                    raw_json = json.loads(content)
-                            except Exception as e:
-                                print(f"⚠️ Could not decode {file_path.name}: {e}")
-                                continue
-
-                            # ✅ Save original JSON
-                            original_bm_json.setdefault(category, []).append({
-                                "filename": file,
-                                "data": raw_json,
-                            })
-
-                            # ✅ Transform for finalisation
-                            transformed = transform_input_json(raw_json)
-                            transformed["filename"] = file
-                            input_finalisation.setdefault(category, []).append(transformed)
-
-                            print(f"✅ Processed {category}/{file}")
+                # Extract and read on the IO pool, straight from the spooled upload
+                try:
+                    input_finalisation, original_bm_json = await run_cancellable(
+                        read_zip_inputs, uploaded_zip.file, store_original_bm_json
+                    )
+                except ArchiveRejected as e:
+                    raise HTTPException(status_code=413, detail=str(e))
 
             else:
                 # ✅ Multiple JSON files (folder structure)
@@ -275,43 +333,27 @@ async def upload_json(
                     category = parts[-2] if len(parts) >= 2 else "Uncategorized"
                     filename = parts[-1]
 
-                    file_content = await uploaded_file.read()
-                    raw_json = None
-
-                    for encoding in encodings:
-                        try:
-                            decoded_content = file_content.decode(encoding)
-                            raw_json = json.loads(decoded_content)
-                            break
-                        except (UnicodeDecodeError, json.JSONDecodeError):
-                            continue
-
-                    if raw_json is None:
-                        print(f"⚠️ Could not decode {filename}, skipping...")
+                    try:
+                        raw_json, transformed_data = await run_blocking(
+                            load_input_upload, uploaded_file.file, store_original_bm_json
+                        )
+                    except Exception as e:
+                        print(f"⚠️ Could not decode {filename}, skipping... ({e})")
                         continue
 
-                    original_bm_json.setdefault(category, []).append({
-                        "filename": filename,
-                        "data": raw_json,
-                    })
+                    if store_original_bm_json:
+                        original_bm_json.setdefault(category, []).append({
+                            "filename": filename,
+                            "data": raw_json,
+                        })
 
-                    transformed_data = transform_input_json(raw_json)
                     transformed_data["filename"] = filename
                     input_finalisation.setdefault(category, []).append(transformed_data)
 
                     print(f"✅ Processed {category}/{filename}")
 
             # ✅ Process output file
-            output_content = await output_file.read()
-            output_json = None
-            for encoding in encodings:
-                try:
-                    decoded_content = output_content.decode(encoding)
-                    output_json = json.loads(decoded_content)
-                    print(f"✅ Decoded output file with: {encoding}")
-                    break
-                except (UnicodeDecodeError, json.JSONDecodeError):
-                    continue
+            output_json = await run_blocking(read_upload_json, output_file.file)
 
             if output_json is None:
                 raise HTTPException(status_code=400, detail="Could not decode output JSON file")
@@ -320,22 +362,51 @@ async def upload_json(
             await update_filter_keys({"finalisation": input_finalisation})
             await update_filter_keys(output_json)
 
+            # ✅ Parse every address once (in parallel) so matching reuses the components
+            parsed_addresses = await run_cancellable(
+                parse_and_prime,
+                input_finalisation,
+                output_json.get("finalisation") if isinstance(output_json, dict) else None,
+            )
+
+            # ✅ Precompute input-vs-output field matches once per upload
+            match_results = await run_blocking(
+                compute_match_results,
+                input_finalisation,
+                output_json.get("finalisation") if isinstance(output_json, dict) else None,
+            )
+
             # ✅ Combine document
             document = {
                 "username": username,
                 "email": email,
                 "finalization_document_name": finalization_document_name,
                 "original_filename": output_file.filename,
-                "input_data": {"finalisation": input_finalisation},
+                "input_data": {"finalisation": compact_finalisation(input_finalisation)},
                 "original_bm_json": original_bm_json,
                 "raw_json": output_json,
                 "upload_date": datetime.utcnow(),
                 "upload_type": "zip_folder" if len(input_files) == 1 and input_files[0].filename.endswith(".zip") else "folder_structure",
                 "input_categories": list(input_finalisation.keys()),
+                "output_categories": output_categories(output_json),
                 "total_input_files": sum(len(v) for v in input_finalisation.values()),
+                "match_results": match_results,
+                "parsed_addresses": parsed_addresses,
+                "revision": 1,
             }
 
+            search_entries = await run_blocking(
+                label_value_entries,
+                input_finalisation,
+                output_json.get("finalisation") if isinstance(output_json, dict) else None,
+            )
+            await run_blocking(encode_payloads, document)
             result = await upload_json_collection.insert_one(document)
+            await replace_document_entries(
+                search_index_collection, result.inserted_id, username, finalization_document_name, search_entries
+            )
+            await replace_document_names(borrower_name_collection, result.inserted_id, borrower_names(search_entries))
+            await bump_revision(revision_collection, "uploadedJSON")
             print(f"✅ Uploaded successfully with ID: {result.inserted_id}")
             print(f"📊 Stored {len(original_bm_json)} categories with original JSONs")
 
@@ -366,14 +437,18 @@ async def upload_json(
 # ===== EXISTING ENDPOINTS (Keep as is) =====
 
 @app.get("/filter_keys")
-async def get_filter_keys():
+async def get_filter_keys(if_none_match: Optional[str] = Header(None)):
     try:
         filter_doc = await filtered_key_collection.find_one({"_id": "filter_keys"})
         
         if not filter_doc:
             return {"keys": []}
         
-        return {"keys": filter_doc.get("keys", [])}
+        etag = make_etag("filter_keys", filter_doc.get("revision", 0), len(filter_doc.get("keys", [])))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, if_none_match)
+
+        return ORJSONResponse({"keys": filter_doc.get("keys", [])}, headers=etag_headers(etag))
     
     except Exception as e:
         print("Get filter keys error:", e)
@@ -388,26 +463,31 @@ async def get_documents_by_category(category: str, username: str = None):
         query = {
             "$or": [
                 {f"raw_json.finalisation.{category}": {"$exists": True}},
-                {f"input_data.finalisation.{category}": {"$exists": True}}
+                {f"input_data.finalisation.{category}": {"$exists": True}},
+                {"output_categories": category},
             ]
         }
         
         if username:
             query["username"] = username
         
-        cursor = upload_json_collection.find(query).sort("_id", -1)
+        # original_bm_json, match_results and parsed_addresses are never part of this response
+        cursor = upload_json_collection.find(
+            query, {"original_bm_json": 0, "match_results": 0, "parsed_addresses": 0}
+        ).sort("_id", -1)
         documents = await cursor.to_list(length=100)
         
         result = []
         for doc in documents:
             # Check if it's input_data or raw_json
             if "input_data" in doc and "finalisation" in doc["input_data"]:
-                category_data = doc["input_data"]["finalisation"].get(category, [])
+                category_data = category_rows(doc["input_data"]["finalisation"].get(category, []))
             else:
-                category_data = doc.get("raw_json", {}).get("finalisation", {}).get(category, [])
+                raw_json = await run_blocking(decode_payload, doc.get("raw_json"))
+                category_data = (raw_json or {}).get("finalisation", {}).get(category, [])
             
             result.append({
-                "_id": str(doc["_id"]),
+                "_id": doc["_id"],
                 "original_filename": doc.get("original_filename", "Unknown"),
                 "finalization_document_name": doc.get("finalization_document_name", ""),
                 "username": doc.get("username", ""),
@@ -416,7 +496,7 @@ async def get_documents_by_category(category: str, username: str = None):
                 "upload_type": doc.get("upload_type", "single_file")
             })
         
-        return {"documents": result, "category": category, "count": len(result)}
+        return ORJSONResponse({"documents": result, "category": category, "count": len(result)})
     
     except Exception as e:
         print("Get documents by category error:", e)
@@ -424,9 +504,69 @@ async def get_documents_by_category(category: str, username: str = None):
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
 
+# ✅ NEW: Cross-document search over label values (labelIndex)
+@app.get("/search")
+async def search(
+    q: str,
+    mode: str = "exact",
+    label: str = None,
+    category: str = None,
+    source: str = None,
+    username: str = None,
+    limit: int = 50,
+    threshold: float = 80,
+):
+    """
+    Which documents mention a value: exact, prefix or fuzzy (rapidfuzz-reranked) match
+    on normalized label values, optionally restricted to one label / category / source
+    ("input" or "output") / username.
+    """
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(SEARCH_MODES)}")
+    if source and source not in SEARCH_SOURCES:
+        raise HTTPException(status_code=400, detail=f"source must be one of: {', '.join(SEARCH_SOURCES)}")
+    limit = max(1, min(limit, 500))
+    try:
+        hits = await search_label_values(
+            search_index_collection, q, mode,
+            label=label, category=category, source=source, username=username,
+            limit=limit, threshold=threshold,
+        )
+        return ORJSONResponse({
+            "query": q,
+            "mode": mode,
+            "hits": hits,
+            "count": len(hits),
+            "document_count": len({hit["document_id"] for hit in hits}),
+        })
+    except Exception as e:
+        print("Search error:", e)
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+
+# ✅ NEW: Borrower lookup across all uploads (phonetic blocking + safe_string_compare)
+@app.get("/borrower_lookup")
+async def borrower_lookup(name: str, limit: int = 20):
+    """Borrower names seen in uploads that match name, with the documents mentioning them"""
+    try:
+        candidates = await find_candidates(borrower_name_collection, name)
+        matches = await run_blocking(verify_candidates, name, candidates, max(1, min(limit, 200)))
+        return ORJSONResponse({"query": name, "candidates": len(candidates), "matches": matches})
+    except Exception as e:
+        print("Borrower lookup error:", e)
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+
 @app.get("/list_json")
-async def list_json(username: str = None):
+async def list_json(username: str = None, if_none_match: Optional[str] = Header(None)):
     try:
+        # ✅ ETag from the collection revision: repeat views skip the query entirely
+        etag = make_etag("list_json", await get_revision(revision_collection, "uploadedJSON"), username or "")
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, if_none_match)
+
         query = {"username": username} if username else {}
         
         # ✅ OPTIMIZATION: Use a projection to fetch only necessary fields
@@ -441,10 +581,7 @@ async def list_json(username: str = None):
         cursor = upload_json_collection.find(query, projection).sort("_id", -1)
         documents = await cursor.to_list(length=100)
         
-        for doc in documents:
-            doc["_id"] = str(doc["_id"])
-        
-        return {"documents": documents}
+        return ORJSONResponse({"documents": documents}, headers=etag_headers(etag))
     
     except Exception as e:
         print("List error:", e)
@@ -453,22 +590,31 @@ async def list_json(username: str = None):
 
 
 @app.get("/get_json_by_filename")
-async def get_json_by_filename(filename: str, username: str = None):
+async def get_json_by_filename(filename: str, username: str = None, if_none_match: Optional[str] = Header(None)):
     try:
         query = {"original_filename": filename}
         if username:
             query["username"] = username
         
-        document = await upload_json_collection.find_one(query)
+        # ✅ Revision-only read first; the full document is fetched only when it changed
+        head = await upload_json_collection.find_one(query, {"revision": 1})
         
-        if not document:
+        if not head:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        document["_id"] = str(document["_id"])
+        etag = make_etag(head["_id"], head.get("revision", 0))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, if_none_match)
+
+        # parsed_addresses is ingest-time matching state, not part of the document response
+        document = await upload_json_collection.find_one({"_id": head["_id"]}, {"parsed_addresses": 0})
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
         
         print(f"✅ Found document by filename: {filename}")
         
-        return document
+        await run_blocking(decode_payloads, document, ("raw_json", "original_bm_json"))
+        return ORJSONResponse(expand_document(document), headers=etag_headers(etag))
     
     except HTTPException:
         raise
@@ -479,21 +625,30 @@ async def get_json_by_filename(filename: str, username: str = None):
 
 
 @app.get("/get_json/{document_id}")
-async def get_json(document_id: str):
+async def get_json(document_id: str, if_none_match: Optional[str] = Header(None)):
     try:
         from bson import ObjectId
         
         if not ObjectId.is_valid(document_id):
             raise HTTPException(status_code=400, detail="Invalid document ID")
         
-        document = await upload_json_collection.find_one({"_id": ObjectId(document_id)})
+        # ✅ Revision-only read first; the full document is fetched only when it changed
+        head = await upload_json_collection.find_one({"_id": ObjectId(document_id)}, {"revision": 1})
         
-        if not document:
+        if not head:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        document["_id"] = str(document["_id"])
+        etag = make_etag(head["_id"], head.get("revision", 0))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, if_none_match)
+
+        # parsed_addresses is ingest-time matching state, not part of the document response
+        document = await upload_json_collection.find_one({"_id": head["_id"]}, {"parsed_addresses": 0})
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
         
-        return document
+        await run_blocking(decode_payloads, document, ("raw_json", "original_bm_json"))
+        return ORJSONResponse(expand_document(document), headers=etag_headers(etag))
     
     except HTTPException:
         raise
@@ -503,6 +658,107 @@ async def get_json(document_id: str):
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
 
+@app.get("/match_results/{document_id}")
+async def get_match_results(document_id: str):
+    """
+    Precomputed input-vs-output field matches stored at ingest time
+    (reads only the match_results sub-document).
+    """
+    try:
+        from bson import ObjectId
+
+        if not ObjectId.is_valid(document_id):
+            raise HTTPException(status_code=400, detail="Invalid document ID")
+
+        document = await upload_json_collection.find_one(
+            {"_id": ObjectId(document_id)}, {"match_results": 1, "finalization_document_name": 1}
+        )
+
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+
+        return ORJSONResponse({
+            "_id": document["_id"],
+            "finalization_document_name": document.get("finalization_document_name", ""),
+            "match_results": document.get("match_results"),
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("Fetch match results error:", e)
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+
+# ✅ NEW: Streaming export of finalisation label values
+def _export_response(export_format, source, username, category, date_from, date_to, labels):
+    sources = list(EXPORT_SOURCES) if source == "both" else [source]
+    if any(s not in EXPORT_SOURCES for s in sources):
+        raise HTTPException(status_code=400, detail="source must be 'input', 'output' or 'both'")
+
+    try:
+        start = datetime.fromisoformat(date_from) if date_from else None
+        end = datetime.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date_from/date_to must be ISO dates (YYYY-MM-DD)")
+
+    label_set = {l.strip() for l in labels.split(",") if l.strip()} if labels else None
+
+    rows = iter_export_rows(
+        upload_json_collection,
+        build_export_query(username, category, start, end, sources),
+        build_export_projection(category, sources),
+        sources,
+        category=category,
+        labels=label_set,
+    )
+
+    if export_format == "csv":
+        body, media_type = stream_csv(rows), "text/csv"
+    else:
+        body, media_type = stream_ndjson(rows), "application/x-ndjson"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="finalisation_export.{export_format}"'},
+    )
+
+
+@app.get("/export/ndjson")
+async def export_ndjson(
+    source: str = "both",
+    username: str = None,
+    category: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    labels: str = None,
+):
+    """
+    Streams finalisation label values as NDJSON, one value per line.
+
+    :param source: "input" (input_data), "output" (raw_json) or "both"
+    :param date_from: upload_date lower bound (inclusive, ISO date)
+    :param date_to: upload_date upper bound (exclusive, ISO date)
+    :param labels: comma-separated label names to keep
+    """
+    return _export_response("ndjson", source, username, category, date_from, date_to, labels)
+
+
+@app.get("/export/csv")
+async def export_csv(
+    source: str = "both",
+    username: str = None,
+    category: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    labels: str = None,
+):
+    """Same as /export/ndjson, encoded as CSV with a header row"""
+    return _export_response("csv", source, username, category, date_from, date_to, labels)
+
+
 @app.delete("/delete_json/{document_id}")
 async def delete_json(document_id: str):
     try:
@@ -512,6 +768,9 @@ async def delete_json(document_id: str):
             raise HTTPException(status_code=400, detail="Invalid document ID")
         
         result = await upload_json_collection.delete_one({"_id": ObjectId(document_id)})
+        await remove_document_entries(search_index_collection, [ObjectId(document_id)])
+        await remove_document_names(borrower_name_collection, [ObjectId(document_id)])
+        await bump_revision(revision_collection, "uploadedJSON")
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -529,6 +788,7 @@ async def delete_json(document_id: str):
 # ✅ NEW: Property/Name Validation Endpoint
 @app.post("/validate_property")
 async def validate_property(
+    request: Request,
     value1: str = Form(...),
     value2: str = Form(...),
     match_type: str = Form(...)
@@ -541,6 +801,8 @@ async def validate_property(
     :param value2: Second string to compare  
     :param match_type: "Address" or "Name"
     :return: {"is_valid": bool, "match_type": str, "values": [str, str]}
+
+    Runs on the validation process pool; a full queue answers 429 with Retry-After.
     """
     try:
         # Map frontend types to backend field types
@@ -553,8 +815,8 @@ async def validate_property(
         
         print(f"🔍 Validating ({match_type}): '{value1}' vs '{value2}'")
         
-        # ✅ Call manager's validation function
-        result = safe_string_compare(value1, value2, field_type=field_type)
+        # ✅ Call manager's validation function (off the event loop)
+        result = await request.app.state.validation_pool.compare(value1, value2, field_type)
         
         print(f"✅ Result: {result}")
         
@@ -564,6 +826,8 @@ async def validate_property(
             "values": [value1, value2]
         }
     
+    except PoolOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(f"❌ Validation error: {e}")
         traceback.print_exc()
@@ -571,6 +835,169 @@ async def validate_property(
 
 
 
+# ✅ NEW: One-to-many address matching
+@app.post("/match_address")
+async def match_address(request: AddressMatchRequest):
+    """
+    Ranks candidate addresses against a reference address (e.g. the note's property address)
+    in one call instead of one /validate_property call per pair.
+
+    :return: {"reference": str, "matches": [...], "match_count": int}
+    """
+    try:
+        # Parsing and fuzzy scoring of many candidates is CPU work: keep it off the loop
+        matches = await run_blocking(
+            match_address_against_many, request.reference, request.candidates, threshold=request.threshold
+        )
+        return {
+            "reference": request.reference,
+            "matches": matches,
+            "match_count": sum(1 for m in matches if m["is_match"]),
+        }
+
+    except Exception as e:
+        print(f"❌ Address match error: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Address match error: {str(e)}")
+
+
+# ✅ NEW: Versioned matching profiles + background re-validation
+@app.get("/match_profiles")
+async def get_match_profiles():
+    return {"profiles": MATCH_PROFILES}
+
+
+@app.put("/match_profiles/{field_type}")
+async def put_match_profile(field_type: str, changes: MatchProfileUpdate):
+    """
+    Updates thresholds for one field type (name, address, default).
+    The profile version is bumped and a re-validation job re-scores stored results
+    for that field type only.
+    """
+    try:
+        before = MATCH_PROFILES.get(field_type, {}).get("version")
+        profile = await update_match_profile(
+            match_profile_collection, field_type, changes.dict(exclude_none=True)
+        )
+        job_id = None
+        if profile["version"] != before:
+            job_id = await start_revalidation_job(
+                upload_json_collection, job_collection, profile_collection=match_profile_collection
+            )
+        return {"field_type": field_type, "profile": profile, "revalidation_job_id": job_id}
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Profile update error: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Profile update error: {str(e)}")
+
+
+# Shared by the resumable job endpoints (see app/core/jobs.py)
+def _resumed(resumed, job_id):
+    if not resumed:
+        raise HTTPException(status_code=404, detail="Job not found or already completed")
+    return {"job_id": job_id, "status": "running"}
+
+
+async def _job_response(job_type, job_id):
+    job = await get_job(job_collection, job_type, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ORJSONResponse(job)
+
+
+@app.post("/revalidation_jobs")
+async def create_revalidation_job():
+    """Re-scores every stored result produced by an older profile (or never scored)"""
+    job_id = await start_revalidation_job(
+        upload_json_collection, job_collection, profile_collection=match_profile_collection
+    )
+    return {"job_id": job_id}
+
+
+@app.post("/revalidation_jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    resumed = await resume_revalidation_job(
+        upload_json_collection, job_collection, job_id, profile_collection=match_profile_collection
+    )
+    return _resumed(resumed, job_id)
+
+
+@app.get("/revalidation_jobs/{job_id}")
+async def get_revalidation_job(job_id: str):
+    return await _job_response(REVALIDATION_JOB, job_id)
+
+
+# ✅ NEW: Background compression of stored raw_json / original_bm_json
+@app.post("/payload_compression_jobs")
+async def create_payload_compression_job():
+    """Compresses existing documents with the STORAGE_CODEC codec and backfills output_categories"""
+    codec = storage_codec()
+    if codec is None:
+        raise HTTPException(status_code=400, detail="Set STORAGE_CODEC (zstd or zlib) to enable payload compression")
+    job_id = await start_payload_migration(upload_json_collection, job_collection, codec)
+    return {"job_id": job_id, "codec": codec}
+
+
+@app.post("/payload_compression_jobs/{job_id}/resume")
+async def resume_payload_compression_job(job_id: str):
+    return _resumed(await resume_payload_migration(upload_json_collection, job_collection, job_id), job_id)
+
+
+@app.get("/payload_compression_jobs/{job_id}")
+async def get_payload_compression_job(job_id: str):
+    return await _job_response(PAYLOAD_COMPRESSION_JOB, job_id)
+
+
+# ✅ NEW: Index documents stored before /search and /borrower_lookup existed
+@app.post("/search_index_jobs")
+async def create_search_index_job():
+    job_id = await start_search_index_rebuild(
+        upload_json_collection, search_index_collection, borrower_name_collection, job_collection
+    )
+    return {"job_id": job_id}
+
+
+@app.post("/search_index_jobs/{job_id}/resume")
+async def resume_search_index_job(job_id: str):
+    resumed = await resume_search_index_rebuild(
+        upload_json_collection, search_index_collection, borrower_name_collection, job_collection, job_id
+    )
+    return _resumed(resumed, job_id)
+
+
+@app.get("/search_index_jobs/{job_id}")
+async def get_search_index_job(job_id: str):
+    return await _job_response(SEARCH_INDEX_JOB, job_id)
+
+
+# ✅ NEW: Recent request profiles
+def _require_profile_admin(request: Request):
+    # Without a configured token profiles are not downloadable at all
+    admin_token = os.getenv("PROFILE_ADMIN_TOKEN", "")
+    if not admin_token or request.headers.get("x-profile") != admin_token:
+        raise HTTPException(status_code=403, detail="Profile access requires the admin X-Profile header")
+
+
+@app.get("/profiles")
+async def list_profiles(request: Request):
+    """Recent profiles (newest first) with their top functions by cumulative time"""
+    _require_profile_admin(request)
+    return {"profiles": profile_index.recent()}
+
+
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, request: Request):
+    """Raw cProfile dump (open with pstats, snakeviz, ...)"""
+    _require_profile_admin(request)
+    entry = profile_index.get(profile_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(os.path.join(get_profiles_dir(), entry["file"]), filename=entry["file"])
+
+
 # ✅ NEW: Batch Processing Endpoint
 @app.post("/batch_process")
 async def batch_process(
@@ -578,6 +1005,7 @@ async def batch_process(
     output_folder_path: str = Form(...),
     username: str = Form(...),
     email: str = Form(...),
+    store_original_bm_json: bool = Form(True),
 ):
     r"""
     Batch process all ZIP files from:
@@ -585,9 +1013,13 @@ async def batch_process(
     and their matching JSONs from:
         C:\Users\LDNA40022\Lokesh\finalization_json\source\output
 
-    After successful DB save, move processed files to:
+    Documents are upserted in unordered bulk writes (flushed every BATCH_WRITE_MAX_OPS
+    documents or BATCH_WRITE_MAX_BYTES). After a successful DB save, move processed files to:
         C:\Users\LDNA40022\Lokesh\finalization_json\Processed\input
         C:\Users\LDNA40022\Lokesh\finalization_json\Processed\output
+
+    With store_original_bm_json=false, input JSONs are streamed and only the
+    transformed label values are kept (original_bm_json is left empty).
     """
     try:
         print(f"🚀 Starting batch process")
@@ -595,160 +1027,59 @@ async def batch_process(
         print(f"📁 Output folder: {output_folder_path}")
 
         # ✅ Validate paths
-        if not os.path.exists(input_folder_path):
+        if not await run_blocking(os.path.exists, input_folder_path):
             raise HTTPException(status_code=400, detail=f"Input folder not found: {input_folder_path}")
-        if not os.path.exists(output_folder_path):
+        if not await run_blocking(os.path.exists, output_folder_path):
             raise HTTPException(status_code=400, detail=f"Output folder not found: {output_folder_path}")
 
         # ✅ Derive base path — go up two levels from /source/input → /finalization_json
-        base_root = os.path.dirname(os.path.dirname(input_folder_path.rstrip("\\/")))
-        processed_root = os.path.join(base_root, "Processed")
-        processed_input = os.path.join(processed_root, "input")
-        processed_output = os.path.join(processed_root, "output")
-
-        # ✅ Create Processed directories if not exist
-        os.makedirs(processed_input, exist_ok=True)
-        os.makedirs(processed_output, exist_ok=True)
+        processed_input, processed_output = await run_blocking(make_processed_dirs, input_folder_path)
 
         print(f"📦 Processed Input Folder: {processed_input}")
         print(f"📦 Processed Output Folder: {processed_output}")
 
         # ✅ Find ZIPs
-        zip_files = glob.glob(os.path.join(input_folder_path, "*.zip"))
+        zip_files = await run_blocking(glob.glob, os.path.join(input_folder_path, "*.zip"))
         if not zip_files:
             raise HTTPException(status_code=400, detail="No ZIP files found in input folder")
 
         print(f"📊 Found {len(zip_files)} ZIP files")
 
-        results = {"total": len(zip_files), "successful": [], "failed": [], "skipped": []}
-        encodings = ["utf-8", "utf-8-sig", "windows-1252", "latin-1", "iso-8859-1"]
+        ingest = BatchIngest(
+            upload_json_collection, filtered_key_collection, revision_collection,
+            search_index_collection, borrower_name_collection, username, email, processed_input, processed_output,
+            keep_original=store_original_bm_json,
+        )
+        results = {"total": len(zip_files), **ingest.results}
 
         # ✅ Process ZIPs
         for zip_path in zip_files:
             zip_filename = os.path.basename(zip_path)
-            base_name = zip_filename.replace(".zip", "")
 
             print(f"\n{'=' * 60}")
             print(f"📦 Processing ZIP: {zip_filename}")
 
             try:
-                output_json_name = f"{base_name}_final.json"
+                output_json_name = output_json_name_for(zip_filename)
                 output_json_path = os.path.join(output_folder_path, output_json_name)
 
-                if not os.path.exists(output_json_path):
+                if not await run_blocking(os.path.exists, output_json_path):
                     print(f"⚠️ Missing output JSON: {output_json_name}")
-                    results["skipped"].append({"filename": zip_filename, "reason": "Output JSON missing"})
+                    ingest.skip(zip_filename, "Output JSON missing")
                     continue
 
                 print(f"✅ Found matching output: {output_json_name}")
 
-                # === ORIGINAL ZIP EXTRACTION + JSON PARSING ===
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    temp_path = Path(temp_dir)
-                    print(f"📂 Extracting ZIP → {temp_dir}")
-                    with zipfile.ZipFile(zip_path, "r") as zip_ref:
-                        zip_ref.extractall(temp_dir)
-
-                    input_finalisation = {}
-                    original_bm_json = {}
-
-                    for root, _, files in os.walk(temp_dir):
-                        for file in files:
-                            if not file.endswith(".json"):
-                                continue
-
-                            file_path = Path(root) / file
-                            relative_path = file_path.relative_to(temp_path)
-                            path_parts = str(relative_path).split(os.sep)
-                            category = path_parts[0] if len(path_parts) > 1 else "Uncategorized"
-
-                            try:
-                                with open(file_path, "r", encoding="utf-8") as f:
-                                    raw_json = json.load(f)
-                            except Exception as e:
-                                print(f"⚠️ Could not read {file}: {e}")
-                                continue
-
-                            # Store original JSON
-                            original_bm_json.setdefault(category, []).append(
-                                {"filename": file, "data": raw_json}
-                            )
-
-                            # Transform for DB
-                            transformed = transform_input_json(raw_json)
-                            transformed["filename"] = file
-                            input_finalisation.setdefault(category, []).append(transformed)
-                            print(f"✅ Processed {category}/{file}")
-
-                    # === Parse output JSON ===
-                    with open(output_json_path, "r", encoding="utf-8") as f:
-                        output_json = None
-                        for enc in encodings:
-                            try:
-                                output_json = json.loads(f.read())
-                                print(f"✅ Decoded output file with: {enc}")
-                                break
-                            except (UnicodeDecodeError, json.JSONDecodeError):
-                                f.seek(0)
-                        if output_json is None:
-                            raise Exception("Could not decode output JSON")
-
-                    # === Update Filter Keys ===
-                    await update_filter_keys({"finalisation": input_finalisation})
-                    await update_filter_keys(output_json)
-
-                    # === Save to MongoDB ===
-                    existing_doc = await upload_json_collection.find_one(
-                        {"username": username, "finalization_document_name": base_name}
-                    )
-
-                    document = {
-                        "username": username,
-                        "email": email,
-                        "finalization_document_name": base_name,
-                        "original_filename": output_json_name,
-                        "input_data": {"finalisation": input_finalisation},
-                        "original_bm_json": original_bm_json,
-                        "raw_json": output_json,
-                        "upload_date": datetime.utcnow(),
-                        "upload_type": "batch_zip",
-                        "input_categories": list(input_finalisation.keys()),
-                        "total_input_files": sum(len(v) for v in input_finalisation.values()),
-                    }
-
-                    if existing_doc:
-                        await upload_json_collection.update_one({"_id": existing_doc["_id"]}, {"$set": document})
-                        print(f"🔄 Updated document: {base_name}")
-                    else:
-                        await upload_json_collection.insert_one(document)
-                        print(f"✅ Inserted new document: {base_name}")
-
-                    # === MOVE FILES TO PROCESSED ===
-                    dest_zip = os.path.join(processed_input, zip_filename)
-                    dest_json = os.path.join(processed_output, output_json_name)
-
-                    try:
-                        if os.path.exists(dest_zip):
-                            os.remove(dest_zip)
-                        if os.path.exists(dest_json):
-                            os.remove(dest_json)
-
-                        os.replace(zip_path, dest_zip)
-                        os.replace(output_json_path, dest_json)
-
-                        print(f"📁 Moved ZIP → {dest_zip}")
-                        print(f"📄 Moved JSON → {dest_json}")
-                    except Exception as move_err:
-                        print(f"⚠️ Move error for {zip_filename}: {move_err}")
-
-                    results["successful"].append(
-                        {"zip_file": zip_filename, "output_file": output_json_name, "document_name": base_name}
-                    )
+                # === ZIP extraction, parsing and match precomputation (IO pool), queued for a bulk upsert ===
+                await ingest.add_pair(zip_path, output_json_path)
 
             except Exception as e:
                 print(f"❌ Error processing {zip_filename}: {e}")
                 traceback.print_exc()
-                results["failed"].append({"filename": zip_filename, "error": str(e)})
+                ingest.fail(zip_filename, e)
+
+        # === Flush remaining writes, then update filter keys once ===
+        await ingest.flush()
 
         print(f"\n{'=' * 60}")
         print(f"Batch Processing Complete")